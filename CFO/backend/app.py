@@ -1,22 +1,11 @@
 # from langchain_huggingface import HuggingFaceEndpoint, HuggingFaceEmbeddings, ChatHuggingFace, HuggingFacePipeline
 # from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
-from langchain_core.prompts import PromptTemplate, ChatPromptTemplate, ChatMessagePromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_community.document_loaders import WebBaseLoader, PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough, RunnableLambda
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain.retrievers.multi_query import MultiQueryRetriever
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
 from dotenv import load_dotenv
-from flask import Flask ,render_template ,redirect ,url_for ,request ,flash , abort, session
+from flask import Flask ,render_template ,redirect ,url_for ,request ,flash , abort, session, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_bcrypt import Bcrypt
 from functools import wraps
 from datetime import datetime
@@ -24,13 +13,26 @@ from flask_restful import Api, Resource
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_restful import Api
 from flask_login import LoginManager,UserMixin,login_required, login_user, logout_user, current_user
-from flask import jsonify
+from flask import jsonify, Response, Request, stream_with_context
 from datetime import datetime
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
-import numpy as np
-import pandas as pd
+import json
+import multiprocessing
+import time
+import zipfile
+from extraction import ConcurrencyBudget, run_metric_tasks, unique_documents
+from financial_facts import PREVIOUS_YEAR_FIELDS, REPORTED, COMPARATIVE, company_from_filename, company_key, report_facts, reuse_previous_year
+import jobs
+import batches
+import chat_memory
+import telemetry
+from telemetry import span
+from services import ServiceRegistry
+from upload_store import StagedUpload, UploadStore, UploadTooLargeError
+# LangChain, Gemini, FAISS, pandas and the modules built on them are imported by the services and
+# functions that use them, so starting a worker (or serving a login page) does not load them.
 
 
 
@@ -45,15 +47,100 @@ cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
 api = Api(app)
 app.config["JWT_SECRET_KEY"] = "super-secret"
 basedir=os.path.abspath(os.path.dirname(__file__))
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(basedir,"app.db")
+# databases, uploads, FAISS indexes and caches live here (default: next to app.py)
+datadir = os.path.abspath(os.getenv('CFO_DATA_DIR', basedir))
+os.makedirs(datadir, exist_ok=True)
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(datadir,"app.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config['SECRET_KEY'] = 'projectbangayaapna'
 bcrypt = Bcrypt(app)
 db = SQLAlchemy(app)
+
+
+@event.listens_for(db.session, 'before_commit')
+def start_commit_timer(db_session):
+    db_session.info['commit_started'] = time.perf_counter()
+
+
+@event.listens_for(db.session, 'after_commit')
+def record_commit(db_session):
+    started = db_session.info.pop('commit_started', None)
+    if started is not None:
+        telemetry.record("db_commit", started)
+
+
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'xls', 'xlsx'}
-app.config['UPLOAD_FOLDER'] = os.path.join(basedir, UPLOAD_FOLDER)
+app.config['UPLOAD_FOLDER'] = os.path.join(datadir, UPLOAD_FOLDER)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# uploaded reports are refused while they stream in, as soon as one passes this size
+app.config['UPLOAD_MAX_MB'] = int(os.getenv('UPLOAD_MAX_MB', 200))
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'], max_bytes=app.config['UPLOAD_MAX_MB'] * 1024 * 1024)
+
+
+class UploadRequest(Request):
+    """Uploaded files are written straight into the upload store's staging area and hashed as they stream in."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # A batch's zip archive is bounded by the batch's unpacked size instead.
+        is_zip = (filename or '').lower().endswith('.zip')
+        staged = upload_store.open_stream(app.config['BATCH_MAX_UNPACKED_MB'] * 1024 * 1024 if is_zip else None)
+        if content_length and content_length > staged.max_bytes:
+            staged.close()
+            raise UploadTooLargeError(f"{filename} is larger than {staged.max_bytes // (1024 * 1024)} MB.")
+        return staged
+
+
+app.request_class = UploadRequest
+app.config['EXTRACTION_MAX_CONCURRENCY'] = int(os.getenv('EXTRACTION_MAX_CONCURRENCY', 6))
+app.config['EXTRACTION_CALL_TIMEOUT'] = float(os.getenv('EXTRACTION_CALL_TIMEOUT', 45))
+# 'per_metric' makes one LLM call per field, 'batched' fills every field in a single structured call
+app.config['EXTRACTION_MODE'] = os.getenv('EXTRACTION_MODE', 'per_metric')
+EXTRACTION_MODES = {'per_metric', 'batched'}
+# Excel metrics matched by the rule-based table parser at or above this confidence skip the LLM
+app.config['TABLE_PARSER_MIN_CONFIDENCE'] = float(os.getenv('TABLE_PARSER_MIN_CONFIDENCE', 0.85))
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+# PDF metrics only search their statement's pages, widened by this many pages on each side
+app.config['DOCUMENT_MAP_PAGE_MARGIN'] = int(os.getenv('DOCUMENT_MAP_PAGE_MARGIN', 1))
+# chunks sent per PDF metric, picked by hybrid BM25 + vector search and a line-item reranker
+app.config['RETRIEVAL_K'] = int(os.getenv('RETRIEVAL_K', 3))
+# Only the cover and the mapped statements (plus this many pages each side) of a PDF are parsed and
+# embedded; set SELECTIVE_PAGE_LOADING=0 to index every page
+app.config['SELECTIVE_PAGE_LOADING'] = os.getenv('SELECTIVE_PAGE_LOADING', '1') != '0'
+app.config['INGEST_PAGE_MARGIN'] = int(os.getenv('INGEST_PAGE_MARGIN', 2))
+# PDF pages are extracted in batches of PDF_PAGE_BATCH across PDF_EXTRACT_WORKERS processes and
+# embedded EMBED_BATCH_CHUNKS chunks at a time (unset: the defaults in pdf_pages and indexing)
+app.config['PDF_EXTRACT_WORKERS'] = int(os.getenv('PDF_EXTRACT_WORKERS', 0)) or None
+app.config['PDF_PAGE_BATCH'] = int(os.getenv('PDF_PAGE_BATCH', 0)) or None
+app.config['EMBED_BATCH_CHUNKS'] = int(os.getenv('EMBED_BATCH_CHUNKS', 0)) or None
+# Chat prompts carry a rolling summary plus the most recent messages that fit this token budget
+app.config['CHAT_HISTORY_MAX_TOKENS'] = int(os.getenv('CHAT_HISTORY_MAX_TOKENS', chat_memory.DEFAULT_WINDOW_TOKENS))
+app.config['CHAT_HISTORY_FETCH_LIMIT'] = int(os.getenv('CHAT_HISTORY_FETCH_LIMIT', chat_memory.DEFAULT_FETCH_LIMIT))
+app.config['CHAT_SUMMARY_MIN_MESSAGES'] = int(os.getenv('CHAT_SUMMARY_MIN_MESSAGES', chat_memory.DEFAULT_SUMMARY_MIN_MESSAGES))
+job_store = jobs.JobStore(os.path.join(datadir, "jobs.db"))
+# PDF extraction workers are spawned and re-import this module; only the server process owns the jobs
+if multiprocessing.parent_process() is None:
+    job_store.fail_unfinished("Interrupted by a server restart.")
+job_runner = jobs.JobRunner(job_store, max_workers=app.config['JOB_WORKERS'])
+# Batch imports analyze BATCH_WORKERS documents at a time on their own pool; across everything that is
+# running, at most LLM_MAX_CONCURRENCY extraction calls are in flight
+app.config['BATCH_WORKERS'] = int(os.getenv('BATCH_WORKERS', batches.DEFAULT_BATCH_WORKERS))
+app.config['BATCH_MAX_FILES'] = int(os.getenv('BATCH_MAX_FILES', 500))
+app.config['BATCH_MAX_UNPACKED_MB'] = int(os.getenv('BATCH_MAX_UNPACKED_MB', 2048))
+# Directories and zips on the server's disk can be imported only from below this folder (unset: disabled)
+app.config['BATCH_IMPORT_ROOT'] = os.getenv('BATCH_IMPORT_ROOT', '')
+app.config['LLM_MAX_CONCURRENCY'] = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+llm_budget = ConcurrencyBudget(app.config['LLM_MAX_CONCURRENCY'])
+# seconds before a Gemini request is abandoned, so a hung call cannot hold its concurrency slot for good
+app.config['LLM_REQUEST_TIMEOUT'] = float(os.getenv('LLM_REQUEST_TIMEOUT', 60))
+batch_store = batches.BatchStore(os.path.join(datadir, "jobs.db"))
+# the last TRACE_RECENT analysis jobs and ?trace=1 requests keep a JSON trace of their stages (0: none)
+app.config['TRACE_RECENT'] = int(os.getenv('TRACE_RECENT', telemetry.DEFAULT_RECENT_TRACES))
+telemetry.configure(app.config['TRACE_RECENT'])
+# when set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+if multiprocessing.parent_process() is None:
+    batch_store.requeue_interrupted()
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 login_manager = LoginManager()
@@ -70,8 +157,46 @@ def load_user(user_id):
 
 # the langchain code 
 load_dotenv()
-FAISS_INDEX_PATH = "C:/Users/abhay/Desktop/CFO/backend/faiss_index"
-model = ChatGoogleGenerativeAI(model='gemini-1.5-flash')
+FAISS_INDEX_ROOT = os.path.join(datadir, "faiss_index")
+EMBEDDING_CACHE_DIR = os.path.join(datadir, "embedding_cache")
+# models, caches and chains are built on first use (see services.py) and shared after that
+services = ServiceRegistry()
+
+
+@services.register
+def llm_cache():
+    """Responses for identical (model, rendered prompt, output schema) are served from llm_cache.db."""
+    from llm_cache import PersistentLLMCache
+    return PersistentLLMCache(
+        os.path.join(datadir, "llm_cache.db"),
+        ttl_seconds=float(os.getenv('LLM_CACHE_TTL_HOURS', 720)) * 3600,
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', 20000))
+    )
+
+
+@services.register
+def llm_telemetry():
+    """Times every chat model call and counts its tokens, per pipeline stage (see /metrics)."""
+    return telemetry.llm_callback_handler()
+
+
+@services.register
+def model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model='gemini-1.5-flash', cache=services.llm_cache, callbacks=[services.llm_telemetry], timeout=app.config['LLM_REQUEST_TIMEOUT']
+    )
+
+
+@services.register
+def chat_model():
+    """Conversational answers are never cached."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model='gemini-1.5-flash', cache=False, callbacks=[services.llm_telemetry], timeout=app.config['LLM_REQUEST_TIMEOUT']
+    )
+
+
 class FinancialReportData(BaseModel):
     company_name: str = Field(description="Name of the company")
     fiscal_year: str = Field(description="The fiscal year of the report, e.g., 'FY24'")
@@ -86,13 +211,81 @@ class FinancialReportData(BaseModel):
     total_current_liabilities: float = Field(description="The value for the 'Total current liabilities' line item from the Consolidated Balance Sheet.")
     total_equity: float = Field(description="The value for the 'Total equity' line item from the Consolidated Balance Sheet.")
 
-recursive_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+@services.register
+def recursive_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+
 def format_docs(retrieved_docs):
     context_text = "\n\n".join([doc.page_content for doc in retrieved_docs])
     return context_text
-embedding_model = GoogleGenerativeAIEmbeddings(model='text-embedding-004')
-populate_pydantic_model_prompt = PromptTemplate(
-    template="""
+
+
+@services.register
+def embedding_model():
+    """
+    Embedding calls are batched, kept within the API's per-minute quotas and retried on 429s;
+    EMBEDDING_BACKEND=fake swaps in the local deterministic backend of benchmarks/fakes.py for offline runs.
+    """
+    from embedding_scheduler import EmbeddingScheduler
+    if os.getenv('EMBEDDING_BACKEND') == 'fake':
+        from benchmarks.fakes import FakeEmbeddingBackend
+        embedding_backend = FakeEmbeddingBackend()
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embedding_backend = GoogleGenerativeAIEmbeddings(model='text-embedding-004')
+    return EmbeddingScheduler(
+        embedding_backend,
+        requests_per_minute=int(os.getenv('EMBEDDING_RPM', 1500)),
+        tokens_per_minute=int(os.getenv('EMBEDDING_TPM', 0)),
+        max_batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', 100)),
+        max_retries=int(os.getenv('EMBEDDING_MAX_RETRIES', 6))
+    )
+
+
+@services.register
+def indexing_embeddings():
+    """Index builds go through the cache so boilerplate chunks seen in earlier reports are not re-embedded."""
+    from embedding_cache import cached_embeddings
+    return cached_embeddings(
+        services.embedding_model, EMBEDDING_CACHE_DIR, max_bytes=int(os.getenv('EMBEDDING_CACHE_MAX_MB', 512)) * 1024 * 1024
+    )
+
+
+@services.register
+def vector_store_cache():
+    """Loaded indexes stay in memory (LRU, bounded by VECTOR_STORE_CACHE_MAX_MB) so repeat analyses skip deserialization."""
+    from langchain_community.vectorstores import FAISS
+    from hybrid_retrieval import loaded_size_bytes
+    from vector_store_cache import VectorStoreCache
+    return VectorStoreCache(
+        lambda index_path: FAISS.load_local(index_path, services.embedding_model, allow_dangerous_deserialization=True),
+        max_bytes=int(os.getenv('VECTOR_STORE_CACHE_MAX_MB', 1024)) * 1024 * 1024,
+        sizer=loaded_size_bytes
+    )
+
+
+@services.register
+def document_mapping_chain():
+    """Statement page ranges read from the report's table of contents, saved next to each index."""
+    from document_map import DocumentMap, document_navigator_prompt
+    return document_navigator_prompt | services.model.with_structured_output(DocumentMap)
+
+
+def invoke_document_mapping(inputs):
+    with llm_budget:
+        return services.document_mapping_chain.invoke(inputs)
+
+
+def map_report_pages(pages, page_count, page_text):
+    from langchain_core.runnables import RunnableLambda
+    from document_map import map_document
+    return map_document(pages, page_count, RunnableLambda(invoke_document_mapping), services.indexing_embeddings, services.recursive_splitter, page_text)
+
+
+POPULATE_PYDANTIC_MODEL_TEMPLATE = """
         ## ROLE
         You are an expert financial data extraction system. Your purpose is to read a given text context and accurately extract specific financial figures.
 
@@ -110,11 +303,7 @@ populate_pydantic_model_prompt = PromptTemplate(
         ---
         ## CONTEXT
         {final_context_from_rag}
-    """,
-    input_variables=['final_context_from_rag']
-)
-structured_model = model.with_structured_output(FinancialReportData)
-str_parser = StrOutputParser()
+    """
 class ExtractedValue(BaseModel):
     """A model to capture a numerical value and its associated unit."""
     value: float = Field(description="The numerical value extracted from the text, ignoring commas.")
@@ -139,6 +328,71 @@ def normalize_to_crore(extracted_data: ExtractedValue) -> float:
     return value
 
 
+class FinancialReportExtraction(BaseModel):
+    """Every FinancialReportData figure in one structured call, each keeping the unit it was reported in."""
+    fiscal_year: Optional[str] = Field(description="The fiscal year of the report, e.g., 'FY24'")
+    revenue_current_year: Optional[ExtractedValue] = Field(description="Revenue from operations for the current fiscal year.")
+    revenue_previous_year: Optional[ExtractedValue] = Field(description="Revenue from operations for the previous fiscal year.")
+    profit_after_tax_current_year: Optional[ExtractedValue] = Field(description="Profit or Loss for the current year.")
+    profit_after_tax_previous_year: Optional[ExtractedValue] = Field(description="Profit or Loss for the previous year.")
+    total_liabilities: Optional[ExtractedValue] = Field(description="Sum of current and non-current liabilities for the current year.")
+    cash_reserves: Optional[ExtractedValue] = Field(description="The consolidated cash balance at the end of the current year.")
+    net_cash_from_operations: Optional[ExtractedValue] = Field(description="Net cash generated from or used in operating activities for the current year.")
+    total_current_assets: Optional[ExtractedValue] = Field(description="The value for the 'Total current assets' line item from the Consolidated Balance Sheet.")
+    total_current_liabilities: Optional[ExtractedValue] = Field(description="The value for the 'Total current liabilities' line item from the Consolidated Balance Sheet.")
+    total_equity: Optional[ExtractedValue] = Field(description="The value for the 'Total equity' line item from the Consolidated Balance Sheet.")
+
+@services.register
+def batched_extraction_chain():
+    from langchain_core.prompts import PromptTemplate
+    populate_pydantic_model_prompt = PromptTemplate(template=POPULATE_PYDANTIC_MODEL_TEMPLATE, input_variables=['final_context_from_rag'])
+    return populate_pydantic_model_prompt | services.model.with_structured_output(FinancialReportExtraction)
+
+def failed_metric_value(key):
+    """What a metric that could not be extracted is stored as; it is also listed in failed_metrics."""
+    return str(datetime.now().year) if key == 'fiscal_year' else 0.0
+
+
+def extraction_to_answers(extraction: FinancialReportExtraction):
+    """Normalizes every numeric field of a batched extraction to crores; returns (answers, fields left empty)."""
+    answers = {}
+    missing = []
+    for key, extracted_value in extraction:
+        if not extracted_value:
+            missing.append(key)
+            answers[key] = failed_metric_value(key)
+        elif key == 'fiscal_year':
+            answers[key] = extracted_value
+        else:
+            answers[key] = normalize_to_crore(extracted_value)
+    return answers, missing
+
+
+def run_batched_extraction(context, fields, **span_attributes):
+    """
+    Fills the given fields from one structured call over the context, under the same timeout
+    and LLM budget as a per-metric call. Returns (answers, errors) like run_metric_tasks: fields
+    the model left empty are errors, and so is every field when the call fails or times out.
+    """
+    def extract():
+        with span("batched_extraction", **span_attributes):
+            return services.batched_extraction_chain.invoke({'final_context_from_rag': context})
+
+    results, call_errors = run_metric_tasks(
+        {"batched_extraction": extract},
+        max_concurrency=1,
+        timeout=app.config['EXTRACTION_CALL_TIMEOUT'],
+        budget=llm_budget
+    )
+    if call_errors:
+        print(f"  -> Batched extraction failed: {call_errors['batched_extraction']!r}")
+        return {key: failed_metric_value(key) for key in fields}, {key: call_errors['batched_extraction'] for key in fields}
+    print(f"  -> Raw Batched Data: {results['batched_extraction']}")
+    answers, missing = extraction_to_answers(results['batched_extraction'])
+    errors = {key: ValueError(f"'{key}' was not found in the report") for key in missing if key in fields}
+    return {key: value for key, value in answers.items() if key in fields}, errors
+
+
 class FinancialDataLocationMap(BaseModel):
     """
     A structured map that links each financial metric to the specific Excel sheet
@@ -161,6 +415,73 @@ class FinancialDataLocationMap(BaseModel):
     net_cash_from_operations: Optional[str] = Field(description="The name of the sheet containing the Cash Flow Statement.")
 
 
+EXCEL_QUESTIONS = {
+    "company_name": "What is the registered name of the company?",
+    "fiscal_year": "What is the most recent fiscal year designation (e.g., FY25)?",
+    "cash_reserves": "What is the 'Consolidated cash balance' for the most recent year?",
+    "revenue_current_year": "What is 'Revenue from operations' for the most recent year shown in the data?",
+    "revenue_previous_year": "What is 'Revenue from operations' for the year before the most recent one?",
+    "profit_after_tax_current_year": "What is the 'Profit / (loss) for the year' for the most recent year?",
+    "profit_after_tax_previous_year": "What is the 'Profit / (loss) for the year' for the year before the most recent one?",
+    "total_current_assets": "What is the value for 'Total current assets' for the most recent year?",
+    "total_current_liabilities": "What is the value for 'Total current liabilities' for the most recent year?",
+    "total_liabilities": "What is the value for 'Total liabilities' for the most recent year?",
+    "total_equity": "What is the value for 'Total equity' for the most recent year?",
+    "net_cash_from_operations": "What is the value for 'Net cash generated from / (used in) operating activities' for the most recent year?"
+}
+
+
+@services.register
+def excel_metric_synonyms():
+    from table_parser import build_synonyms
+    return build_synonyms({key: question for key, question in EXCEL_QUESTIONS.items() if key != 'company_name'})
+
+
+EXCEL_SHEET_MAP_TEMPLATE = """
+                    You are an expert financial document analyst. Your primary task is to create a structural map of an Excel workbook.
+
+                    Analyze the provided list of sheet names . For **each financial metric** listed in the JSON schema, determine which sheet is the most likely source for that information.
+
+                    **Instructions:**
+                    - Group related metrics. For example, all revenue and profit figures will be on the same "Profit & Loss" sheet. All assets, liabilities, and equity figures will be on the same "Balance Sheet".
+                    - If you cannot confidently determine the location for a metric based on the provided context (e.g., the names and content are generic like 'Sheet1'), you MUST use `null` for that field.
+
+                    **CONTEXT FROM WORKBOOK:**
+                    {sheet_names}
+               """
+EXCEL_METRIC_TEMPLATE = """
+                You are a precise data extraction bot specializing in parsing CSV data from financial tables. Your task is to find a single metric.
+
+                **Instructions:**
+                1.  First, analyze the column headers in the CSV CONTEXT to determine the overall unit for the data (e.g., 'in Crores', 'in Thousands', 'in Lakhs').
+                2.  Next, find the specific **METRIC TO FIND** in the first column.
+                3.  Locate the value for that metric in the correct year's column.
+                4.  Extract the numerical value and the overall unit you identified in step 1.
+                5.  Pay close attention to negative numbers, often in parentheses like (971).
+                6.  If the metric cannot be found, return null for both value and unit.
+
+                **CSV CONTEXT:**
+                {sheet_context}
+
+                **METRIC TO FIND:**
+                {metric_to_find}
+                """
+
+
+@services.register
+def excel_sheet_map_chain():
+    """Which sheet each metric the table parser could not match is likely on."""
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(EXCEL_SHEET_MAP_TEMPLATE) | services.model.with_structured_output(FinancialDataLocationMap)
+
+
+@services.register
+def excel_metric_chain():
+    """Value and unit of one metric from a sheet rendered as CSV."""
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(EXCEL_METRIC_TEMPLATE) | services.model.with_structured_output(ExtractedValue)
+
+
 from pydantic import BaseModel, Field
 from typing import List, Literal
 
@@ -180,58 +501,37 @@ class RiskAnalysisReport(BaseModel):
     mitigation_recommendations: List[str] = Field(description="A bulleted list of the top 3-4 high-level strategic recommendations to mitigate the most critical risks identified.")
 
 
+RISK_ANALYSIS_TEMPLATE = """
+        You are an expert risk analyst for a top-tier financial consultancy. Your task is to conduct a thorough risk assessment based ONLY on the provided financial data and KPIs.
 
+        Analyze the data and populate a JSON object that strictly adheres to the provided schema.
 
-# financial shit 
-def calculate_kpis(data: FinancialReportData) -> dict:
-    kpis = {}
-
-    if data.revenue_previous_year > 0:
-        growth = ((data.revenue_current_year - data.revenue_previous_year) / data.revenue_previous_year) * 100
-        kpis['revenue_growth_percent'] = round(growth, 2)
-    else:
-        kpis['revenue_growth_percent'] = None
-
-    if data.revenue_current_year > 0:
-        margin = (data.profit_after_tax_current_year / data.revenue_current_year) * 100
-        kpis['profit_margin_percent'] = round(margin, 2)
-    else:
-        kpis['profit_margin_percent'] = None
+        **Instructions:**
+        - **Overall Score:** Calculate an overall risk score from 0 (very low risk) to 100 (very high risk). A profitable, high-growth, low-debt company should have a low score. A company burning cash with high debt should have a high score.
+        - **Categorize Risks:** Identify specific risks and categorize them as Financial, Operational, or Market risks.
+        - **Cite Evidence:** For each risk, you MUST cite the specific KPI or data point that supports your conclusion in the description.
+        - **Be Actionable:** Provide a concise, actionable recommendation for each identified risk.
+        - A separate, high-level summary of the top 3-4 **Risk Mitigation Recommendations** for the board.
 
-    monthly_cash_flow = data.net_cash_from_operations / 12
-    kpis['monthly_net_cash_flow'] = round(monthly_cash_flow, 2)
-    if monthly_cash_flow < 0:
-        kpis['monthly_burn_rate'] = abs(round(monthly_cash_flow, 2))
-    else:
-        kpis['monthly_burn_rate'] = 0 
+        **FINANCIAL DATA & KPIS:**
+        {financial_context}
+        """
 
 
-    if kpis['monthly_burn_rate'] > 0:
-        runway = data.cash_reserves / kpis['monthly_burn_rate']
-        kpis['runway_months'] = round(runway, 2)
-    else:
-        kpis['runway_months'] = "Infinity"
+@services.register
+def risk_chain():
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(RISK_ANALYSIS_TEMPLATE) | services.model.with_structured_output(RiskAnalysisReport)
 
-    if data.total_current_liabilities > 0:
-        current_ratio = data.total_current_assets / data.total_current_liabilities
-        kpis['current_ratio'] = round(current_ratio, 2)
-    else:
-        kpis['current_ratio'] = None
 
 
-    if data.total_equity is not None and data.total_equity != 0:
-        debt_to_equity = data.total_liabilities / data.total_equity
-        kpis['debt_to_equity_ratio'] = round(debt_to_equity, 2)
-    else:
-        kpis['debt_to_equity_ratio'] = None
 
-    if data.total_equity is not None and data.total_equity != 0:
-        roe = (data.profit_after_tax_current_year / data.total_equity) * 100
-        kpis['return_on_equity_percent'] = round(roe, 2)
-    else:
-        kpis['return_on_equity_percent'] = None
-        
-    return kpis
+# financial shit 
+def calculate_kpis(data: FinancialReportData) -> dict:
+    """Single-report view of the vectorized KPI engine (kpi_engine.compute_kpis works on whole tables)."""
+    from kpi_engine import report_kpis
+    with span("kpis"):
+        return report_kpis(data.model_dump())
 
 
 
@@ -259,18 +559,377 @@ class User(db.Model, UserMixin):
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_message'
+    __table_args__ = (
+        db.Index('ix_chat_message_user_timestamp', 'user_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key = True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     is_user_message = db.Column(db.Boolean, default=False)
     message = db.Column(db.String(2000))
     timestamp = db.Column(db.DateTime, default = datetime.utcnow)
 
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "is_user_message": self.is_user_message,
+            "message": self.message,
+            "timestamp": self.timestamp.isoformat()
+        }
+
+
+class ChatSummary(db.Model):
+    """Rolling summary of a user's chat messages up to and including (last_message_at, last_message_id)."""
+    __tablename__ = 'chat_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key = True)
+    content = db.Column(db.Text, nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default = datetime.utcnow, onupdate = datetime.utcnow)
+
+
+class AnalyzedDocument(db.Model):
+    __tablename__ = 'analyzed_document'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'document_hash', name='uq_analyzed_document_user_hash'),
+        db.Index('ix_analyzed_document_user_updated', 'user_id', 'updated_at'),
+    )
+    id = db.Column(db.Integer, primary_key = True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    document_hash = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(300))
+    file_path = db.Column(db.String(1000))
+    extraction_mode = db.Column(db.String(30))
+    created_at = db.Column(db.DateTime, default = datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default = datetime.utcnow, onupdate = datetime.utcnow)
+    financials = db.relationship('ExtractedFinancials', uselist=False, lazy='joined', cascade='all, delete-orphan')
+    kpis = db.relationship('DocumentKPIs', uselist=False, lazy='joined', cascade='all, delete-orphan')
+    reports = db.relationship('GeneratedReport', lazy='joined', cascade='all, delete-orphan')
+
+    def report(self, kind):
+        return next((report for report in self.reports if report.kind == kind), None)
+
+    def as_dashboard_response(self):
+        narrative = self.report('narrative')
+        return {
+            "extracted_data": self.financials.as_dict() if self.financials else {},
+            "calculated_kpis": self.kpis.values if self.kpis else {},
+            "final_analysis": narrative.content if narrative else "",
+            "failed_metrics": self.financials.failed_metrics if self.financials else [],
+            "extraction_mode": self.extraction_mode
+        }
+
+
+class ExtractedFinancials(db.Model):
+    __tablename__ = 'extracted_financials'
+    document_id = db.Column(db.Integer, db.ForeignKey('analyzed_document.id'), primary_key = True)
+    company_name = db.Column(db.String(200))
+    fiscal_year = db.Column(db.String(50))
+    revenue_current_year = db.Column(db.Float)
+    revenue_previous_year = db.Column(db.Float)
+    profit_after_tax_current_year = db.Column(db.Float)
+    profit_after_tax_previous_year = db.Column(db.Float)
+    total_liabilities = db.Column(db.Float)
+    cash_reserves = db.Column(db.Float)
+    net_cash_from_operations = db.Column(db.Float)
+    total_current_assets = db.Column(db.Float)
+    total_current_liabilities = db.Column(db.Float)
+    total_equity = db.Column(db.Float)
+    failed_metrics = db.Column(db.JSON, default = list)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in FinancialReportData.model_fields}
+
+
+class DocumentKPIs(db.Model):
+    __tablename__ = 'document_kpis'
+    document_id = db.Column(db.Integer, db.ForeignKey('analyzed_document.id'), primary_key = True)
+    values = db.Column(db.JSON, nullable=False)
+    computed_at = db.Column(db.DateTime, default = datetime.utcnow)
+
+
+class GeneratedReport(db.Model):
+    __tablename__ = 'generated_report'
+    __table_args__ = (db.UniqueConstraint('document_id', 'kind', name='uq_generated_report_document_kind'),)
+    id = db.Column(db.Integer, primary_key = True)
+    document_id = db.Column(db.Integer, db.ForeignKey('analyzed_document.id'), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)
+    content = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default = datetime.utcnow)
+
+
+class FinancialFact(db.Model):
+    """One figure of one fiscal year of a user's company, kept across analyses (see financial_facts.py)."""
+    __tablename__ = 'financial_fact'
+    __table_args__ = (db.UniqueConstraint('user_id', 'company_key', 'fiscal_year', 'metric', name='uq_financial_fact_company_year_metric'),)
+    id = db.Column(db.Integer, primary_key = True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    company_key = db.Column(db.String(200), nullable=False)
+    fiscal_year = db.Column(db.Integer, nullable=False)
+    metric = db.Column(db.String(50), nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    # 'reported' by that year's own report, or a 'comparative' taken from the next year's report
+    source = db.Column(db.String(20), nullable=False)
+    document_hash = db.Column(db.String(64))
+    updated_at = db.Column(db.DateTime, default = datetime.utcnow, onupdate = datetime.utcnow)
+
+
+def financial_history(user_id, company_name):
+    """{fiscal_year: {metric: value}} of everything stored for the user's company."""
+    key = company_key(company_name)
+    history = {}
+    if key is None:
+        return history
+    for fact in FinancialFact.query.filter_by(user_id=user_id, company_key=key):
+        history.setdefault(fact.fiscal_year, {})[fact.metric] = fact.value
+    return history
+
+
+def save_financial_facts(user_id, document_hash, result):
+    """Adds an analysis's figures to the company's history; a comparative never replaces a year's reported figure."""
+    extracted = result['extracted_data']
+    key = company_key(extracted.get('company_name'))
+    if key is None:
+        return
+    existing = {(fact.fiscal_year, fact.metric): fact for fact in FinancialFact.query.filter_by(user_id=user_id, company_key=key)}
+    for fiscal_year, metric, value, source in report_facts(extracted, result.get('failed_metrics', [])):
+        fact = existing.get((fiscal_year, metric))
+        if fact is None:
+            fact = FinancialFact(user_id=user_id, company_key=key, fiscal_year=fiscal_year, metric=metric)
+            db.session.add(fact)
+            existing[(fiscal_year, metric)] = fact
+        elif fact.source == REPORTED and source == COMPARATIVE:
+            continue
+        fact.value = value
+        fact.source = source
+        fact.document_hash = document_hash
+
+
+class Upload(db.Model):
+    """A user's reference to an uploaded file; the file itself is stored once per content (see upload_store.py)."""
+    __tablename__ = 'upload'
+    __table_args__ = (db.UniqueConstraint('user_id', 'document_hash', name='uq_upload_user_hash'),)
+    id = db.Column(db.Integer, primary_key = True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    document_hash = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(300))
+    file_path = db.Column(db.String(1000), nullable=False)
+    size_bytes = db.Column(db.BigInteger)
+    uploaded_at = db.Column(db.DateTime, default = datetime.utcnow)
+
+
+def record_upload(user_id, stored, filename, commit=True):
+    """Records (or refreshes) the user's reference to a stored file under the name they uploaded it as."""
+    upload = Upload.query.filter_by(user_id=user_id, document_hash=stored.sha256).first()
+    if upload is None:
+        upload = Upload(user_id=user_id, document_hash=stored.sha256)
+        db.session.add(upload)
+    upload.filename = secure_filename(os.path.basename(filename)) or stored.sha256
+    upload.file_path = stored.path
+    upload.size_bytes = stored.size
+    upload.uploaded_at = datetime.utcnow()
+    if commit:
+        db.session.commit()
+    return upload
+
+
+def store_upload(file, user_id, commit=True):
+    """Moves a received upload to its place in the content-addressed store and records the user's reference to it."""
+    if isinstance(file.stream, StagedUpload):
+        stored = upload_store.commit(file.stream, file.filename)
+    else:
+        stored = upload_store.add(file.stream, file.filename)
+    record_upload(user_id, stored, file.filename, commit=commit)
+    return stored
+
+
+def get_analyzed_document(user_id, document_hash=None):
+    """The user's stored analysis for a document (or their latest one), loaded in a single query."""
+    query = AnalyzedDocument.query.filter_by(user_id=user_id)
+    if document_hash:
+        query = query.filter_by(document_hash=document_hash)
+    return query.order_by(AnalyzedDocument.updated_at.desc()).first()
+
+
+def save_analysis(user_id, document_hash, file_path, result):
+    """Stores an analysis result, replacing any earlier analysis of the same document by this user."""
+    upload = Upload.query.filter_by(user_id=user_id, document_hash=document_hash).first()
+    document = AnalyzedDocument.query.filter_by(user_id=user_id, document_hash=document_hash).first()
+    if document is None:
+        document = AnalyzedDocument(user_id=user_id, document_hash=document_hash)
+        db.session.add(document)
+    document.filename = upload.filename if upload else os.path.basename(file_path)
+    document.file_path = file_path
+    document.extraction_mode = result.get('extraction_mode')
+    document.updated_at = datetime.utcnow()
+
+    extracted = result['extracted_data']
+    document.financials = ExtractedFinancials(
+        failed_metrics=result.get('failed_metrics', []),
+        **{field: extracted.get(field) for field in FinancialReportData.model_fields}
+    )
+    document.kpis = DocumentKPIs(values=result['calculated_kpis'])
+    save_financial_facts(user_id, document_hash, result)
+    if result.get('final_analysis'):
+        save_report(document, 'narrative', result['final_analysis'], commit=False)
+    elif document.report('narrative'):
+        # The old narrative describes the previous KPIs; drop it so the dashboard streams a new one.
+        document.reports.remove(document.report('narrative'))
+    db.session.commit()
+    return document
+
+
+def save_report(document, kind, content, commit=True):
+    report = document.report(kind)
+    if report is None:
+        report = GeneratedReport(kind=kind)
+        document.reports.append(report)
+    report.content = content
+    report.created_at = datetime.utcnow()
+    if commit:
+        db.session.commit()
+    return report
+
+
+def chat_messages_page(user_id, before=None, after=None, limit=20, newest_first=True):
+    """
+    One page of a user's messages by keyset on (timestamp, id), served from
+    ix_chat_message_user_timestamp. before/after are (timestamp, id) cursors.
+    """
+    key = db.tuple_(ChatMessage.timestamp, ChatMessage.id)
+    query = ChatMessage.query.filter(ChatMessage.user_id == user_id)
+    if before:
+        query = query.filter(key < tuple(before))
+    if after:
+        query = query.filter(key > tuple(after))
+    if newest_first:
+        query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+    else:
+        query = query.order_by(ChatMessage.timestamp, ChatMessage.id)
+    return query.limit(limit).all()
+
+
+def summary_cursor(summary):
+    return (summary.last_message_at, summary.last_message_id) if summary else None
+
+
+def load_chat_history(user_id):
+    """
+    Prompt history for the next turn: the stored summary plus the newest unsummarized
+    messages within CHAT_HISTORY_MAX_TOKENS. Reads at most CHAT_HISTORY_FETCH_LIMIT rows,
+    however long the conversation is. Also returns how many older messages still wait to
+    be folded into the summary (a lower bound once the fetch limit is hit).
+    """
+    summary = db.session.get(ChatSummary, user_id)
+    recent = chat_messages_page(user_id, after=summary_cursor(summary), limit=app.config['CHAT_HISTORY_FETCH_LIMIT'])
+    window, older = chat_memory.token_window(recent, app.config['CHAT_HISTORY_MAX_TOKENS'])
+    return chat_memory.build_history(summary.content if summary else None, window), len(older)
+
+
+chat_summaries_running = chat_memory.SingleFlight()
+
+
+def summarize_chat_history(user_id):
+    """Folds every message older than the current window into the user's rolling summary."""
+    if not chat_summaries_running.acquire(user_id):
+        return {"skipped": True}
+    try:
+        with app.app_context():
+            folded = 0
+            while True:
+                summary = db.session.get(ChatSummary, user_id)
+                recent = chat_messages_page(user_id, after=summary_cursor(summary), limit=app.config['CHAT_HISTORY_FETCH_LIMIT'])
+                window, _ = chat_memory.token_window(recent, app.config['CHAT_HISTORY_MAX_TOKENS'])
+                if not window:
+                    break
+                window_start = (window[0].timestamp, window[0].id)
+                batch = [
+                    msg for msg in chat_messages_page(user_id, after=summary_cursor(summary), limit=chat_memory.DEFAULT_SUMMARY_BATCH, newest_first=False)
+                    if (msg.timestamp, msg.id) < window_start
+                ]
+                if not batch:
+                    break
+                with span("chat_summary", messages=len(batch)):
+                    content = chat_memory.fold_into_summary(services.chat_summary_chain.invoke, summary.content if summary else None, batch)
+                if summary is None:
+                    summary = ChatSummary(user_id=user_id)
+                    db.session.add(summary)
+                summary.content = content
+                summary.last_message_at, summary.last_message_id = batch[-1].timestamp, batch[-1].id
+                db.session.commit()
+                folded += len(batch)
+            return {"folded_messages": folded}
+    finally:
+        chat_summaries_running.release(user_id)
+
+
+def record_chat_turn(user_id, question, answer, pending_summary=0):
+    """Stores a finished question/answer pair and, once enough turns fell out of the window, refreshes the summary in the background."""
+    db.session.add(ChatMessage(user_id=user_id, is_user_message=True, message=question))
+    db.session.add(ChatMessage(user_id=user_id, is_user_message=False, message=answer))
+    db.session.commit()
+    # The new turn pushes two more messages out of the window on the next load.
+    if pending_summary + 2 >= app.config['CHAT_SUMMARY_MIN_MESSAGES']:
+        job_runner.submit('chat_summary', lambda report_progress: summarize_chat_history(user_id), user_id=user_id)
+
 
 
 
 
 
+def index_build_options():
+    """build_index settings from the app config. The ingestion margin never goes below the retrieval margin."""
+    options = {
+        "statement_margin": max(app.config['INGEST_PAGE_MARGIN'], app.config['DOCUMENT_MAP_PAGE_MARGIN']) if app.config['SELECTIVE_PAGE_LOADING'] else None,
+    }
+    for option, setting in (("extract_workers", 'PDF_EXTRACT_WORKERS'), ("page_batch", 'PDF_PAGE_BATCH'), ("embed_batch", 'EMBED_BATCH_CHUNKS')):
+        if app.config[setting]:
+            options[option] = app.config[setting]
+    return options
+
+
+def index_uploaded_file(file_path, document_hash=None):
+    """Builds (or reuses) the FAISS index for an uploaded PDF and returns the document hash."""
+    from indexing import ensure_document_index, file_sha256
+    if not file_path.lower().endswith('.pdf'):
+        return document_hash or file_sha256(file_path)
+    document_hash, _ = ensure_document_index(
+        file_path, services.indexing_embeddings, services.recursive_splitter, FAISS_INDEX_ROOT,
+        document_hash=document_hash, mapper=map_report_pages, **index_build_options()
+    )
+    return document_hash
+
+
+
+
 # routes 
+@app.errorhandler(UploadTooLargeError)
+def upload_too_large(error):
+    if request.path.startswith('/api/'):
+        return jsonify({"error": str(error)}), 413
+    flash(str(error), 'danger')
+    return redirect(url_for('home'))
+
+
+@app.before_request
+def start_request_trace():
+    """?trace=1 (or an X-Trace: 1 header) keeps a trace of the request; its id comes back as X-Trace-Id."""
+    if request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1':
+        user_id = current_user.id if current_user.is_authenticated else None
+        g.trace = telemetry.start_trace(f"{request.method} {request.path}", user_id=user_id)
+
+
+@app.after_request
+def add_trace_header(response):
+    if g.get('trace') is not None:
+        response.headers['X-Trace-Id'] = g.trace[1].trace_id
+    return response
+
+
+@app.teardown_request
+def end_request_trace(error=None):
+    telemetry.end_trace(g.pop('trace', None))
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -350,10 +1009,11 @@ def uploadAnnualReport():
         return redirect(url_for('home'))
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(save_path)
-        session['uploaded_file_path'] = save_path
+        # The file was hashed while it streamed in; identical reports share one stored copy.
+        stored = store_upload(file, current_user.id)
+        session['uploaded_file_path'] = stored.path
+        session['document_hash'] = stored.sha256
+        enqueue_analysis(current_user, stored.path, app.config['EXTRACTION_MODE'], stored.sha256)
         flash("file upload Successfull!", "success")
         return redirect(url_for("dashboard"))
     else:
@@ -374,6 +1034,67 @@ def insights():
     return render_template('insights.html')
 
 
+@services.register
+def insights_chat_chain():
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    insights_chat_prompt = ChatPromptTemplate.from_messages([
+        ("system", """You are an expert financial AI assistant. Your role is to answer questions based ONLY on the provided financial data and the ongoing conversation. Be helpful, clear, and concise.
+
+    FINANCIAL DATA CONTEXT:
+    {financial_data}"""),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{question}"),
+    ])
+    return insights_chat_prompt | services.chat_model | StrOutputParser()
+
+
+CHAT_SUMMARY_TEMPLATE = """
+    You keep a running summary of a conversation between a company's finance team and a financial AI assistant.
+    Update the summary with the new messages below. Keep every figure, KPI, decision and open question that was mentioned,
+    drop greetings and repetition, and stay under 200 words.
+
+    CURRENT SUMMARY:
+    {summary}
+
+    NEW MESSAGES:
+    {messages}
+
+    UPDATED SUMMARY:
+"""
+
+
+@services.register
+def chat_summary_chain():
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(CHAT_SUMMARY_TEMPLATE) | services.model | StrOutputParser()
+
+
+def chat_inputs(user, financial_context, question):
+    """Prompt inputs for one insights turn and the number of messages waiting to be summarized."""
+    chat_history, pending_summary = load_chat_history(user.id)
+    return {
+        "financial_data": financial_context,
+        "chat_history": chat_history,
+        "question": question
+    }, pending_summary
+
+
+def sse(data, event=None):
+    """Formats one Server-Sent Event; data is JSON-encoded so tokens may contain newlines."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route("/chatbot/insights", methods=['POST'])
 @login_required
 def chat_bot():
@@ -384,45 +1105,70 @@ def chat_bot():
 
     user = User.query.filter_by(work_email=current_user.work_email).first()
     
-    financial_context = session.get('financial_data', {})
-    if not financial_context:
+    document = get_analyzed_document(user.id, session.get('document_hash'))
+    if not document or not document.kpis:
         return jsonify({"success": False, "response": "Financial data not found. Please analyze a document first."}), 400
+    financial_context = document.kpis.values
 
-    chat_messages = ChatMessage.query.filter_by(user_id=user.id).order_by(ChatMessage.timestamp).all()
-    chat_history_for_chain = []
-    for msg in chat_messages:
-        if msg.is_user_message:
-            chat_history_for_chain.append(HumanMessage(content=msg.message))
-        else:
-            chat_history_for_chain.append(AIMessage(content=msg.message))
+    inputs, pending_summary = chat_inputs(user, financial_context, user_message_text)
+    with span("chat"):
+        result = services.insights_chat_chain.invoke(inputs)
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are an expert financial AI assistant. Your role is to answer questions based ONLY on the provided financial data and the ongoing conversation. Be helpful, clear, and concise.
+    record_chat_turn(user.id, user_message_text, result, pending_summary)
+    return jsonify({'success': True, 'response': result})
 
-        FINANCIAL DATA CONTEXT:
-        {financial_data}"""),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{question}"),
-    ])
 
-    chain = prompt | model | StrOutputParser()
-    result = chain.invoke({
-        "financial_data": financial_context,
-        "chat_history": chat_history_for_chain,
-        "question": user_message_text
-    })
+@app.route("/chatbot/insights/stream", methods=['POST'])
+@login_required
+def chat_bot_stream():
+    """Same as /chatbot/insights, but sends the answer token by token as Server-Sent Events."""
+    data = request.get_json(silent=True) or {}
+    user_message_text = data.get('message', '').strip()
+    if not user_message_text:
+        return jsonify({"success": False, "response": "No message provided."}), 400
 
-    new_user_message = ChatMessage(user_id=user.id, is_user_message=True, message=user_message_text)
-    db.session.add(new_user_message)
-    
-    new_ai_message = ChatMessage(user_id=user.id, is_user_message=False, message=result)
-    db.session.add(new_ai_message)
-    
-    db.session.commit()
-    return jsonify({'success': True, 'response': result})
+    user = User.query.filter_by(work_email=current_user.work_email).first()
+    document = get_analyzed_document(user.id, session.get('document_hash'))
+    if not document or not document.kpis:
+        return jsonify({"success": False, "response": "Financial data not found. Please analyze a document first."}), 400
+    inputs, pending_summary = chat_inputs(user, document.kpis.values, user_message_text)
+    user_id = user.id
+
+    def events():
+        tokens = []
+        try:
+            for token in services.insights_chat_chain.stream(inputs, config={"metadata": {"stage": "chat"}}):
+                tokens.append(token)
+                yield sse({"token": token})
+        except Exception as e:
+            print(f"Chat stream failed: {e!r}")
+            yield sse({"error": "The assistant could not finish its answer. Please try again."}, event='error')
+            return
+        # Only a finished answer is stored, so an aborted stream leaves no half message in the history.
+        record_chat_turn(user_id, user_message_text, "".join(tokens), pending_summary)
+        yield sse({"success": True}, event='done')
+
+    return sse_response(events())
 
 
 
+@app.route("/api/chat/history", methods=['GET'])
+@login_required
+def get_chat_history():
+    """Newest-first pages of the user's chat; pass the returned next_cursor as ?before= for older messages."""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    before = None
+    if request.args.get('before'):
+        try:
+            timestamp, message_id = request.args['before'].rsplit('_', 1)
+            before = (datetime.fromisoformat(timestamp), int(message_id))
+        except ValueError:
+            return jsonify({"error": "Invalid cursor."}), 400
+    messages = chat_messages_page(current_user.id, before=before, limit=limit)
+    next_cursor = f"{messages[-1].timestamp.isoformat()}_{messages[-1].id}" if len(messages) == limit else None
+    return jsonify({"messages": [msg.as_dict() for msg in messages], "next_cursor": next_cursor})
+
+
 @app.route("/risk_page", methods=['POST', 'GET'])
 @login_required
 def risks():
@@ -434,54 +1180,118 @@ def risks():
 @app.route("/api/get-risk-analysis", methods=['POST'])
 @login_required
 def get_risk_analysis():
-    financial_data = session.get('financial_data')
-    if not financial_data:
+    document = get_analyzed_document(current_user.id, session.get('document_hash'))
+    if not document or not document.kpis:
         return jsonify({"error": "Financial data not found. Please analyze a document first."}), 404
-
+    stored_report = document.report('risk')
+    if stored_report and not request.args.get('refresh'):
+        return jsonify(stored_report.content)
+    financial_data = document.kpis.values
+
+    with span("risk_analysis"):
+        risk_report = services.risk_chain.invoke({"financial_context": financial_data}).model_dump()
+    save_report(document, 'risk', risk_report)
     
-    risk_prompt = PromptTemplate.from_template(
-        """
-        You are an expert risk analyst for a top-tier financial consultancy. Your task is to conduct a thorough risk assessment based ONLY on the provided financial data and KPIs.
+    return jsonify(risk_report)
 
-        Analyze the data and populate a JSON object that strictly adheres to the provided schema.
 
-        **Instructions:**
-        - **Overall Score:** Calculate an overall risk score from 0 (very low risk) to 100 (very high risk). A profitable, high-growth, low-debt company should have a low score. A company burning cash with high debt should have a high score.
-        - **Categorize Risks:** Identify specific risks and categorize them as Financial, Operational, or Market risks.
-        - **Cite Evidence:** For each risk, you MUST cite the specific KPI or data point that supports your conclusion in the description.
-        - **Be Actionable:** Provide a concise, actionable recommendation for each identified risk.
-        - A separate, high-level summary of the top 3-4 **Risk Mitigation Recommendations** for the board.
 
-        **FINANCIAL DATA & KPIS:**
-        {financial_context}
-        """
-    )
 
-    risk_model = model.with_structured_output(RiskAnalysisReport)
-    risk_chain = risk_prompt | risk_model
-    
-    risk_report = risk_chain.invoke({"financial_context": financial_data})
-    
-    return jsonify(risk_report.model_dump())
 
+        
+CFO_NARRATIVE_TEMPLATE = """
+    Act as a Chief Financial Officer (CFO) tasked with presenting a financial health report to the company's board of directors. Your analysis must be clear, concise, and grounded in the data provided.
+    All financial figures are in **Indian Rupees (INR Crores)**. Your entire analysis, including all summaries, risks, and recommendations, must be presented in this context. Do not use the word 'dollars' or the '$' symbol.
 
+    Based **only** on the following Key Performance Indicators (KPIs), generate a markdown-formatted report that includes the following three sections:
 
+    1.  **### Financial Summary**
+        A brief, high-level overview of the company's performance.
 
+    2.  **### Key Risks & Opportunities**
+        A bulleted list identifying the most significant financial risks and potential opportunities, citing specific KPIs to support your points.
+
+    3.  **### Strategic Recommendations**
+        A bulleted list of 2-3 actionable recommendations for the leadership team to improve the company's financial position.
+
+    ---
+    **KPIs for Analysis:**
+
+    {kpis}
+"""
+
+
+@services.register
+def narrative_chain():
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(CFO_NARRATIVE_TEMPLATE) | services.model | StrOutputParser()
+
+
+PDF_METRIC_TEMPLATE = """Based ONLY on the following CONTEXT, extract the value and unit for the requested metric.
+            - Pay close attention to words like "loss" or numbers in parentheses like (971). These indicate a negative number, and you MUST return a negative value (e.g., -971).
+
+            CONTEXT:
+            {context}
+            
+            METRIC:
+            {question}
+            """
+PDF_ANSWER_TEMPLATE = "From the context: {context}, answer the question: {question}. Respond with only the answer."
+
+
+@services.register
+def pdf_metric_chain():
+    """Value and unit of one metric from its retrieved chunks (per_metric extraction)."""
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(PDF_METRIC_TEMPLATE) | services.model.with_structured_output(ExtractedValue)
+
+
+@services.register
+def pdf_answer_chain():
+    """Free-text answers (the fiscal year) from retrieved chunks."""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(PDF_ANSWER_TEMPLATE) | services.model | StrOutputParser()
+
+
+def analyze_document(file_path, company_name, extraction_mode, document_hash=None, report_progress=None, refresh=False, include_narrative=True, history=None):
+    """
+    Runs extraction, KPI computation and (unless it will be streamed later) the CFO narrative for one uploaded report.
+    history ({fiscal_year: {metric: value}}, see financial_history) lets the previous-year figures come from
+    last year's analysis instead of a fresh extraction; a refresh extracts everything again.
+    """
+    if refresh:
+        from llm_cache import bypass_llm_cache
+        with bypass_llm_cache():
+            return analyze_document(file_path, company_name, extraction_mode, document_hash, report_progress, include_narrative=include_narrative)
+    kind = os.path.splitext(file_path)[1].lstrip('.').lower()
+    with span("analysis", kind=kind, extraction_mode=extraction_mode):
+        return run_analysis_stages(file_path, company_name, extraction_mode, document_hash, report_progress or (lambda event: None), include_narrative, history or {})
+
+
+def run_analysis_stages(file_path, company_name, extraction_mode, document_hash, report_progress, include_narrative, history):
+    """The body of analyze_document: index, retrieval and extraction per metric, KPIs and the narrative."""
+    def metric_done(key, value, error):
+        report_progress({"stage": "metric", "metric": key, "ok": error is None})
+
+    previous_year_checks = {}
 
-        
-@app.route("/api/get-dashboard-data", methods=['POST'])
-@login_required
-def get_dashboard_data():
-    file_path = session.get('uploaded_file_path')
     if file_path.endswith('.pdf'):
-        print("Loading pre-built FAISS index...")
-        vector_store = FAISS.load_local(
-            FAISS_INDEX_PATH,
-            embedding_model,
-            allow_dangerous_deserialization=True
+        from document_map import load_document_map
+        from hybrid_retrieval import metric_retriever
+        from indexing import ensure_document_index
+        from table_parser import build_synonyms
+        report_progress({"stage": "index"})
+        print("Loading FAISS index for the uploaded report...")
+        document_hash, index_path = ensure_document_index(
+            file_path, services.indexing_embeddings, services.recursive_splitter, FAISS_INDEX_ROOT,
+            document_hash=document_hash, mapper=map_report_pages, **index_build_options()
         )
-        retriever = vector_store.as_retriever(search_kwargs={'k': 5})
-        print("Index loaded successfully.")
+        with span("vector_store"):
+            vector_store = services.vector_store_cache.get(index_path)
+        sections = (load_document_map(index_path) or {}).get('sections', {})
+        print(f"Index loaded successfully. Statement pages: {sections or 'not found, searching the whole report'}")
 
         questions = {
             "fiscal_year": "What is the fiscal year mentioned on the cover of the Annual Report?",
@@ -497,206 +1307,611 @@ def get_dashboard_data():
             "total_equity":"What is the value for 'Total equity' on the Consolidated Balance Sheet for the current fiscal year?"
         }
 
-        extracted_answers = {"company_name": str(current_user.company_name)}
+        labels = build_synonyms(questions)
+        retrievers = {
+            key: metric_retriever(
+                vector_store, index_path, sections, key, labels[key],
+                k=app.config['RETRIEVAL_K'], margin=app.config['DOCUMENT_MAP_PAGE_MARGIN']
+            )
+            for key in questions
+        }
+        extracted_answers = {"company_name": str(company_name)}
+        contexts = {}
         
-        extraction_model = model.with_structured_output(ExtractedValue)
-        extraction_prompt = PromptTemplate.from_template(
-            """Based ONLY on the following CONTEXT, extract the value and unit for the requested metric.
-            - Pay close attention to words like "loss" or numbers in parentheses like (971). These indicate a negative number, and you MUST return a negative value (e.g., -971).
-
-            CONTEXT:
-            {context}
-            
-            METRIC:
-            {question}
-            """
-        )
-        extraction_chain = extraction_prompt | extraction_model
+        def retrieve(key, question):
+            with span("retrieve", metric=key):
+                return retrievers[key].invoke(question)
 
-        for key, question in questions.items():
+        def extract_metric(key, question):
             print(f"Processing: {key}...")
-            
-            if key in [ "fiscal_year"]:
-                retrieved_docs = retriever.invoke(question)
-                context_string = format_docs(retrieved_docs)
-                simple_chain = PromptTemplate.from_template("From the context: {context}, answer the question: {question}. Respond with only the answer.") | model | StrOutputParser()
-                answer = simple_chain.invoke({"context": context_string, "question": question})
-                extracted_answers[key] = answer
-                print(f"  -> Raw Text Answer: '{answer}'")
-                continue
-
-            retrieved_docs = retriever.invoke(question)
-            context_string = format_docs(retrieved_docs)
-            
-            raw_extracted_data = extraction_chain.invoke({
-                "context": context_string,
-                "question": question
-            })
-            print(f"  -> Raw Extracted Data: {raw_extracted_data}")
-            
+            with span("extract_metric", metric=key):
+                context_string = contexts[key] = format_docs(retrieve(key, question))
+
+                if key in ["fiscal_year"]:
+                    answer = services.pdf_answer_chain.invoke({"context": context_string, "question": question})
+                    print(f"  -> Raw Text Answer: '{answer}'")
+                    return answer
+
+                raw_extracted_data = services.pdf_metric_chain.invoke({
+                    "context": context_string,
+                    "question": question
+                })
+            print(f"  -> Raw Extracted Data for {key}: {raw_extracted_data}")
             normalized_value = normalize_to_crore(raw_extracted_data)
-            print(f"  -> Normalized Value (in Crores): {normalized_value}")
-            
-            extracted_answers[key] = normalized_value
+            print(f"  -> Normalized Value for {key} (in Crores): {normalized_value}")
+            return normalized_value
+
+        if extraction_mode == 'batched':
+            retrieval_tasks = {key: (lambda key=key, question=question: retrieve(key, question)) for key, question in questions.items()}
+            retrieved, errors = run_metric_tasks(
+                retrieval_tasks,
+                max_concurrency=app.config['EXTRACTION_MAX_CONCURRENCY'],
+                timeout=app.config['EXTRACTION_CALL_TIMEOUT'],
+                on_complete=metric_done,
+                budget=llm_budget
+            )
+            context_docs = unique_documents(doc for key in questions if key in retrieved for doc in retrieved[key])
+            print(f"Batched extraction over {len(context_docs)} unique chunks...")
+            report_progress({"stage": "batched_extraction"})
+            batched_answers, batched_errors = run_batched_extraction(format_docs(context_docs), list(questions), chunks=len(context_docs))
+            extracted_answers.update(batched_answers)
+            errors.update(batched_errors)
+        else:
+            tasks = {key: (lambda key=key, question=question: extract_metric(key, question)) for key, question in questions.items()}
+            # With figures stored for this company, the comparative column is not extracted up front:
+            # once the fiscal year is known it is cross-checked against last year's figures instead.
+            deferred = list(PREVIOUS_YEAR_FIELDS) if history else []
+            results, errors = run_metric_tasks(
+                {key: task for key, task in tasks.items() if key not in deferred},
+                max_concurrency=app.config['EXTRACTION_MAX_CONCURRENCY'],
+                timeout=app.config['EXTRACTION_CALL_TIMEOUT'],
+                on_complete=metric_done,
+                budget=llm_budget
+            )
+            extracted_answers.update(results)
+            if deferred:
+                if 'fiscal_year' not in errors:
+                    previous_year_checks = reuse_previous_year(extracted_answers, history, contexts, deferred)
+                for key, check in previous_year_checks.items():
+                    print(f"  -> Stored {check['fiscal_year']} figure for {key}: {'confirmed by the report' if check['confirmed'] else 'not in the report, extracting it'}")
+                    if check['confirmed']:
+                        metric_done(key, check['stored'], None)
+                missing = [key for key in deferred if key not in extracted_answers]
+                if missing:
+                    more_results, more_errors = run_metric_tasks(
+                        {key: tasks[key] for key in missing},
+                        max_concurrency=app.config['EXTRACTION_MAX_CONCURRENCY'],
+                        timeout=app.config['EXTRACTION_CALL_TIMEOUT'],
+                        on_complete=metric_done,
+                        budget=llm_budget
+                    )
+                    extracted_answers.update(more_results)
+                    errors.update(more_errors)
+            for key, error in errors.items():
+                print(f"  -> Extraction failed for {key}: {error!r}")
+                extracted_answers[key] = failed_metric_value(key)
 
         final_data = FinancialReportData(**extracted_answers)
 
         kpis = calculate_kpis(final_data)
-        session['financial_data'] = kpis
-        prompt = PromptTemplate.from_template("""
-            Act as a Chief Financial Officer (CFO) tasked with presenting a financial health report to the company's board of directors. Your analysis must be clear, concise, and grounded in the data provided.
-            All financial figures are in **Indian Rupees (INR Crores)**. Your entire analysis, including all summaries, risks, and recommendations, must be presented in this context. Do not use the word 'dollars' or the '$' symbol.
+        final_analysis = ""
+        if include_narrative:
+            report_progress({"stage": "narrative"})
+            with llm_budget, span("narrative"):
+                final_analysis = services.narrative_chain.invoke({'kpis': kpis})
 
-            Based **only** on the following Key Performance Indicators (KPIs), generate a markdown-formatted report that includes the following three sections:
+        final_response = {
+            "extracted_data": extracted_answers,
+            "calculated_kpis": kpis,
+            "final_analysis": final_analysis,
+            "failed_metrics": sorted(errors),
+            "extraction_mode": extraction_mode,
+            "previous_year_checks": previous_year_checks
+        }
 
-            1.  **### Financial Summary**
-                A brief, high-level overview of the company's performance.
+        return final_response
+    
+    elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
+        from table_parser import parse_financial_workbook
+        from workbook import group_metrics_by_sheet, load_workbook
+        with span("workbook_load"):
+            workbook = load_workbook(file_path)
+            sheet_names = workbook.sheet_names
+            workbook.load(sheet_names)
+
+
+        questions = EXCEL_QUESTIONS
+        extracted_excel_ans = {"company_name": str(company_name)}
+
+        # Rule-based fast path: read line items straight from the sheets and only ask the
+        # LLM for metrics the table parser could not match confidently.
+        with span("table_parse"):
+            parsed_metrics = parse_financial_workbook({sheet: workbook.frame(sheet) for sheet in sheet_names}, services.excel_metric_synonyms)
+        for key, parsed in parsed_metrics.items():
+            if parsed.confidence < app.config['TABLE_PARSER_MIN_CONFIDENCE']:
+                continue
+            print(f"  -> Table parser matched {key} on '{parsed.sheet}' ({parsed.label!r}, confidence {parsed.confidence})")
+            if key == 'fiscal_year':
+                extracted_excel_ans[key] = parsed.value
+            else:
+                extracted_excel_ans[key] = normalize_to_crore(ExtractedValue(value=parsed.value, unit=parsed.unit))
+            metric_done(key, extracted_excel_ans[key], None)
+
+        # Previous-year figures the table parser could not read come from the stored history when
+        # they match the workbook (cross-checked against the current-year figure's sheet).
+        reusable = [key for key in PREVIOUS_YEAR_FIELDS if key not in extracted_excel_ans]
+        if history and reusable and 'fiscal_year' in extracted_excel_ans:
+            def counterpart_sheets(field):
+                parsed = parsed_metrics.get(field)
+                return "\n".join(workbook.csv(sheet) for sheet in ([parsed.sheet] if parsed else sheet_names))
+            counterparts = {PREVIOUS_YEAR_FIELDS[key][1] for key in reusable}
+            previous_year_checks = reuse_previous_year(extracted_excel_ans, history, {field: counterpart_sheets(field) for field in counterparts}, reusable)
+            for key, check in previous_year_checks.items():
+                if check['confirmed']:
+                    metric_done(key, extracted_excel_ans[key], None)
+
+        remaining = [key for key in questions if key not in extracted_excel_ans]
+        errors = {}
+        if remaining:
+            print(f"Falling back to the LLM for: {remaining}")
+
+            with llm_budget, span("excel_sheet_map"):
+                ai_generated_map = services.excel_sheet_map_chain.invoke({"sheet_names": sheet_names})
+            ai_generated_map = {key: sheet for key, sheet in ai_generated_map.model_dump().items() if key in remaining}
+
+            print(ai_generated_map)
+
+            # Parse every mapped sheet in one pass and render each sheet's CSV context once,
+            # however many metrics live on it.
+            metrics_by_sheet = group_metrics_by_sheet(ai_generated_map)
+            workbook.load(metrics_by_sheet)
+            sheet_contexts = {sheet: workbook.csv(sheet) for sheet in metrics_by_sheet if sheet in workbook.sheet_names}
+
+            def extract_excel_metric(key, sheet_name_to_process):
+                print(f"Processing: {key}...")
+                csv_for_sheet = sheet_contexts.get(sheet_name_to_process)
+                if csv_for_sheet is None:
+                    raise KeyError(f"Sheet '{sheet_name_to_process}' not found in workbook")
+
+                with span("extract_metric", metric=key):
+                    raw_data = services.excel_metric_chain.invoke({'sheet_context':csv_for_sheet, "metric_to_find":questions[key]})
+                if key == 'fiscal_year':
+                    current_date = datetime.now()
+                    return str(raw_data.value) or str(current_date.year)
+                return normalize_to_crore(raw_data)
+
+            if extraction_mode == 'batched':
+                sheets_to_read = list(sheet_contexts)
+                workbook_context = "\n\n".join(f"SHEET: {sheet}\n{sheet_contexts[sheet]}" for sheet in sheets_to_read)
+                print(f"Batched extraction over sheets: {sheets_to_read}")
+                report_progress({"stage": "batched_extraction"})
+                batched_answers, errors = run_batched_extraction(workbook_context, remaining, sheets=len(sheets_to_read))
+                extracted_excel_ans.update(batched_answers)
+            else:
+                tasks = {}
+                unmapped = {}
+                for key in ai_generated_map:
+                    sheet_name_to_process = ai_generated_map.get(key)
+                    if not sheet_name_to_process:
+                        print(f"AI could not map a sheet for '{key}'. Skipping.")
+                        unmapped[key] = KeyError(f"No sheet was mapped for '{key}'")
+                        continue
+
+                    tasks[key] = lambda key=key, sheet=sheet_name_to_process: extract_excel_metric(key, sheet)
+
+                results, errors = run_metric_tasks(
+                    tasks,
+                    max_concurrency=app.config['EXTRACTION_MAX_CONCURRENCY'],
+                    timeout=app.config['EXTRACTION_CALL_TIMEOUT'],
+                    on_complete=metric_done,
+                    budget=llm_budget
+                )
+                extracted_excel_ans.update(results)
+                errors.update(unmapped)
+                for key, error in errors.items():
+                    print(f"  -> Extraction failed for {key}: {error!r}")
+                    extracted_excel_ans[key] = failed_metric_value(key)
+        
+        print(extracted_excel_ans)
+        final_data = FinancialReportData(**extracted_excel_ans)
+        kpis = calculate_kpis(final_data)
+        final_analysis = ""
+        if include_narrative:
+            report_progress({"stage": "narrative"})
+            with llm_budget, span("narrative"):
+                final_analysis = services.narrative_chain.invoke({'kpis': kpis})
 
-            2.  **### Key Risks & Opportunities**
-                A bulleted list identifying the most significant financial risks and potential opportunities, citing specific KPIs to support your points.
+        final_response = {
+            "extracted_data": extracted_excel_ans,
+            "calculated_kpis": kpis,
+            "final_analysis": final_analysis,
+            "failed_metrics": sorted(errors),
+            "extraction_mode": extraction_mode,
+            "previous_year_checks": previous_year_checks
+        }
 
-            3.  **### Strategic Recommendations**
-                A bulleted list of 2-3 actionable recommendations for the leadership team to improve the company's financial position.
+        return final_response
 
-            ---
-            **KPIs for Analysis:**
+    raise ValueError(f"Unsupported report type: {os.path.basename(file_path)}")
 
-            {kpis}
-        """)
 
-        prompt_final = prompt.invoke({'kpis':kpis})
-        final_analysis = model.invoke(prompt_final).content
+def enqueue_analysis(user, file_path, extraction_mode, document_hash=None, refresh=False, include_narrative=False):
+    """
+    Queues a background analysis of an uploaded report and returns the job id. The narrative
+    is left out by default; the dashboard streams it from /api/narrative/stream instead.
+    """
+    company_name = user.company_name
+    user_id = user.id
+    from indexing import file_sha256
+    document_hash = document_hash or file_sha256(file_path)
+    history = {} if refresh else financial_history(user_id, company_name)
+
+    def run_analysis(report_progress):
+        result = analyze_document(file_path, company_name, extraction_mode, document_hash, report_progress, refresh, include_narrative, history)
+        with app.app_context():
+            save_analysis(user_id, document_hash, file_path, result)
+        return result
+
+    job_id = job_runner.submit(
+        'analysis',
+        run_analysis,
+        user_id=user_id,
+        payload={"file_path": file_path, "extraction_mode": extraction_mode}
+    )
+    session['analysis_job_id'] = job_id
+    return job_id
+
+
+# batch imports
+def unpack_batch_zip(zip_file, user_id, name=None):
+    """Streams the reports in a zip (a path or an open file) into the upload store and returns them as batch items."""
+    name = name or os.path.basename(zip_file)
+    with zipfile.ZipFile(zip_file) as archive:
+        members = [member for member in archive.infolist() if not member.is_dir() and allowed_file(member.filename)]
+        if sum(member.file_size for member in members) > app.config['BATCH_MAX_UNPACKED_MB'] * 1024 * 1024:
+            raise ValueError(f"{name} unpacks to more than {app.config['BATCH_MAX_UNPACKED_MB']} MB.")
+        items = []
+        for member in members:
+            filename = os.path.basename(member.filename)
+            with archive.open(member) as source:
+                stored = upload_store.add(source, filename)
+            record_upload(user_id, stored, filename, commit=False)
+            items.append({"file_path": stored.path, "filename": filename})
+    return items
+
+
+def save_batch_uploads(files, user_id):
+    """Stores the uploaded reports (and the reports inside uploaded zips); the caller commits the upload references."""
+    items = []
+    for file in files:
+        if not file or not file.filename:
+            continue
+        if file.filename.lower().endswith('.zip'):
+            items.extend(unpack_batch_zip(file.stream, user_id, name=file.filename))
+        elif allowed_file(file.filename):
+            stored = store_upload(file, user_id, commit=False)
+            items.append({"file_path": stored.path, "filename": file.filename})
+    return items
+
+
+def local_batch_items(path, user_id):
+    """Reports in a directory (read in place) or a zip (unpacked) on the server, which must lie below BATCH_IMPORT_ROOT."""
+    root = app.config['BATCH_IMPORT_ROOT']
+    if not root:
+        raise PermissionError("Importing from the server's disk is disabled; set BATCH_IMPORT_ROOT to allow it.")
+    root, path = os.path.realpath(root), os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        raise PermissionError(f"{path} is outside BATCH_IMPORT_ROOT.")
+    if os.path.isfile(path) and path.lower().endswith('.zip'):
+        return unpack_batch_zip(path, user_id)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"{path} is not a directory or a zip file.")
+    items = []
+    for folder, _, filenames in sorted(os.walk(path)):
+        for filename in sorted(filenames):
+            if allowed_file(filename):
+                items.append({"file_path": os.path.join(folder, filename), "filename": filename})
+    return items
+
+
+def run_batch_item(item, report_progress):
+    """
+    Analyzes one document of a batch and stores it like a dashboard analysis. Documents
+    this user already has an analysis of in the same mode are not analyzed again (unless
+    the batch asked for a refresh), so re-importing a portfolio only does the new reports.
+    """
+    options = item['options']
+    file_path = item['file_path']
+    from indexing import file_sha256
+    document_hash = file_sha256(file_path)
+    history = {}
+    if not options.get('refresh'):
+        with app.app_context():
+            existing = get_analyzed_document(item['user_id'], document_hash)
+            if existing and existing.extraction_mode == options['extraction_mode']:
+                return document_hash
+            history = financial_history(item['user_id'], item['company_name'])
+    result = analyze_document(
+        file_path, item['company_name'], options['extraction_mode'], document_hash, report_progress,
+        refresh=bool(options.get('refresh')), include_narrative=False, history=history
+    )
+    with app.app_context():
+        save_analysis(item['user_id'], document_hash, file_path, result)
+    return document_hash
 
-        final_response = {
-            "extracted_data": extracted_excel_ans,
-            "calculated_kpis": kpis,
-            "final_analysis": final_analysis
-        }
 
-        return jsonify(final_response)
-    
-    elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
-        xls = pd.ExcelFile(file_path)
-        sheet_names = xls.sheet_names
+batch_runner = batches.BatchRunner(batch_store, run_batch_item, max_workers=app.config['BATCH_WORKERS'])
 
 
-        questions = {
-            "company_name": "What is the registered name of the company?",
-            "fiscal_year": "What is the most recent fiscal year designation (e.g., FY25)?",
-            "cash_reserves": "What is the 'Consolidated cash balance' for the most recent year?",
-            "revenue_current_year": "What is 'Revenue from operations' for the most recent year shown in the data?",
-            "revenue_previous_year": "What is 'Revenue from operations' for the year before the most recent one?",
-            "profit_after_tax_current_year": "What is the 'Profit / (loss) for the year' for the most recent year?",
-            "profit_after_tax_previous_year": "What is the 'Profit / (loss) for the year' for the year before the most recent one?",
-            "total_current_assets": "What is the value for 'Total current assets' for the most recent year?",
-            "total_current_liabilities": "What is the value for 'Total current liabilities' for the most recent year?",
-            "total_liabilities": "What is the value for 'Total liabilities' for the most recent year?",
-            "total_equity": "What is the value for 'Total equity' for the most recent year?",
-            "net_cash_from_operations": "What is the value for 'Net cash generated from / (used in) operating activities' for the most recent year?"
-        }
+@app.route("/api/batches", methods=['POST'])
+@login_required
+def create_batch():
+    """
+    Starts analyzing many reports at once: multipart `files` (PDF, Excel or zip archives),
+    or JSON/form `path` naming a directory or zip below BATCH_IMPORT_ROOT.
+    """
+    options = request.get_json(silent=True) or request.form.to_dict()
+    extraction_mode = options.get('extraction_mode', app.config['EXTRACTION_MODE'])
+    if extraction_mode not in EXTRACTION_MODES:
+        return jsonify({"error": f"Unknown extraction_mode '{extraction_mode}'."}), 400
+    refresh = str(options.get('refresh', '')).lower() in ('1', 'true', 'yes')
+
+    batch_id = batch_store.create(current_user.id, {"extraction_mode": extraction_mode, "refresh": refresh})
+    try:
+        company_names = options.get('company_names') or {}
+        if isinstance(company_names, str):
+            company_names = json.loads(company_names)
+        if options.get('path'):
+            items = local_batch_items(options['path'], current_user.id)
+        else:
+            items = save_batch_uploads(request.files.getlist('files'), current_user.id)
+        if not items:
+            raise ValueError("No PDF or Excel reports found.")
+        if len(items) > app.config['BATCH_MAX_FILES']:
+            raise ValueError(f"A batch can hold at most {app.config['BATCH_MAX_FILES']} reports, got {len(items)}.")
+    except (OSError, ValueError, zipfile.BadZipFile, UploadTooLargeError) as e:
+        db.session.rollback()
+        batch_store.delete(batch_id)
+        status = 403 if isinstance(e, PermissionError) else 413 if isinstance(e, UploadTooLargeError) else 400
+        return jsonify({"error": str(e)}), status
+    db.session.commit()
 
-        mapping_prompt = PromptTemplate.from_template(
-            """
-                You are an expert financial document analyst. Your primary task is to create a structural map of an Excel workbook.
+    # Company names default to the file name without its extension, years and report words, so one
+    # company's reports of different years share a name (and their figures; see financial_facts.py).
+    for item in items:
+        stem = os.path.splitext(item['filename'])[0]
+        item['company_name'] = company_names.get(item['filename'], company_names.get(stem, company_from_filename(item['filename'])))
+    batch_store.add_items(batch_id, items)
+    batch_runner.start(batch_id)
+    return jsonify({"batch_id": batch_id, "documents": len(items), "status_url": url_for('get_batch', batch_id=batch_id)}), 202
 
-                Analyze the provided list of sheet names . For **each financial metric** listed in the JSON schema, determine which sheet is the most likely source for that information.
 
-                **Instructions:**
-                - Group related metrics. For example, all revenue and profit figures will be on the same "Profit & Loss" sheet. All assets, liabilities, and equity figures will be on the same "Balance Sheet".
-                - If you cannot confidently determine the location for a metric based on the provided context (e.g., the names and content are generic like 'Sheet1'), you MUST use `null` for that field.
+def owned_batch(batch_id):
+    batch = batch_store.get(batch_id)
+    return batch if batch and batch['user_id'] == current_user.id else None
 
-                **CONTEXT FROM WORKBOOK:**
-                {sheet_names}
-           """
-        )
-        mapping_model = model.with_structured_output(FinancialDataLocationMap)
-        mapping_chain = mapping_prompt | mapping_model
-        ai_generated_map = mapping_chain.invoke({"sheet_names": sheet_names})
-        ai_generated_map = ai_generated_map.model_dump()
 
-        print(ai_generated_map)
+@app.route("/api/batches/<batch_id>", methods=['GET'])
+@login_required
+def get_batch(batch_id):
+    """Per-document progress and errors of a batch, plus the KPI table of the documents analyzed so far."""
+    batch = owned_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found."}), 404
+    analyzed = [item['document_hash'] for item in batch['items'] if item['status'] == jobs.SUCCEEDED]
+    return jsonify({
+        "batch_id": batch['id'],
+        "status": batch['status'],
+        "counts": batch['counts'],
+        "documents": [
+            {
+                "position": item['position'],
+                "filename": item['filename'] or os.path.basename(item['file_path']),
+                "company_name": item['company_name'],
+                "status": item['status'],
+                "stage": item['stage'],
+                "error": item['error'],
+                "attempts": item['attempts'],
+                "document_hash": item['document_hash'],
+            }
+            for item in batch['items']
+        ],
+        "kpis": portfolio_kpi_rows(current_user.id, analyzed) if analyzed else []
+    })
 
-        extracted_excel_ans = {}
-        excel_metric_prompt = PromptTemplate.from_template(
-            """
-            You are a precise data extraction bot specializing in parsing CSV data from financial tables. Your task is to find a single metric.
 
-            **Instructions:**
-            1.  First, analyze the column headers in the CSV CONTEXT to determine the overall unit for the data (e.g., 'in Crores', 'in Thousands', 'in Lakhs').
-            2.  Next, find the specific **METRIC TO FIND** in the first column.
-            3.  Locate the value for that metric in the correct year's column.
-            4.  Extract the numerical value and the overall unit you identified in step 1.
-            5.  Pay close attention to negative numbers, often in parentheses like (971).
-            6.  If the metric cannot be found, return null for both value and unit.
+@app.route("/api/batches/<batch_id>/resume", methods=['POST'])
+@login_required
+def resume_batch(batch_id):
+    """Queues the documents of a batch that were interrupted or never started, and (by default) retries failed ones."""
+    if owned_batch(batch_id) is None:
+        return jsonify({"error": "Batch not found."}), 404
+    options = request.get_json(silent=True) or {}
+    queued = batch_runner.start(batch_id, retry_failed=options.get('retry_failed', True))
+    return jsonify({"batch_id": batch_id, "queued": queued, "status_url": url_for('get_batch', batch_id=batch_id)}), 202
 
-            **CSV CONTEXT:**
-            {sheet_context}
 
-            **METRIC TO FIND:**
-            {metric_to_find}
-            """
-        )
-        extraction_model = model.with_structured_output(ExtractedValue)
-        excel_chain = excel_metric_prompt | extraction_model
-        for key in ai_generated_map:
+@app.route("/api/get-dashboard-data", methods=['POST'])
+@login_required
+def get_dashboard_data():
+    file_path = session.get('uploaded_file_path')
+    if not file_path or not os.path.exists(file_path):
+        return jsonify({"error": "No uploaded report found. Please upload a document first."}), 400
+    options = request.get_json(silent=True) or {}
+    extraction_mode = options.get('extraction_mode', app.config['EXTRACTION_MODE'])
+    if extraction_mode not in EXTRACTION_MODES:
+        return jsonify({"error": f"Unknown extraction_mode '{extraction_mode}'."}), 400
+
+    if not options.get('refresh'):
+        from indexing import file_sha256
+        document = get_analyzed_document(current_user.id, session.get('document_hash') or file_sha256(file_path))
+        if document and document.extraction_mode == extraction_mode:
+            return jsonify({"status": jobs.SUCCEEDED, "result": document.as_dashboard_response()})
+
+    job = job_store.get(session.get('analysis_job_id', ''))
+    reusable = (
+        job and not options.get('refresh')
+        and job['payload'].get('file_path') == file_path
+        and job['payload'].get('extraction_mode') == extraction_mode
+        and job['status'] != jobs.FAILED
+    )
+    job_id = job['id'] if reusable else enqueue_analysis(
+        current_user, file_path, extraction_mode, session.get('document_hash'), refresh=bool(options.get('refresh'))
+    )
+    return jsonify({"job_id": job_id, "status_url": url_for('get_job_status', job_id=job_id)}), 202
 
-            if key=='company_name':
-                extracted_excel_ans[key] = str(current_user.company_name)
-                continue
 
-            sheet_name_to_process = ai_generated_map.get(key)
-            if not sheet_name_to_process:
-                print(f"AI could not map a sheet for '{key}'. Skipping.")
-                extracted_excel_ans[key] = None
-                continue
+@app.route("/api/narrative/stream", methods=['GET'])
+@login_required
+def stream_narrative():
+    """Streams the CFO narrative for the current document, generating and storing it on first request."""
+    document = get_analyzed_document(current_user.id, session.get('document_hash'))
+    if not document or not document.kpis:
+        return jsonify({"error": "Financial data not found. Please analyze a document first."}), 404
+    stored = document.report('narrative')
+    kpis = document.kpis.values
+    document_id = document.id
+    refresh = bool(request.args.get('refresh'))
+
+    def events():
+        if stored and stored.content and not refresh:
+            yield sse({"token": stored.content})
+            yield sse({"cached": True}, event='done')
+            return
+        tokens = []
+        try:
+            for token in services.narrative_chain.stream({'kpis': kpis}, config={"metadata": {"stage": "narrative"}}):
+                tokens.append(token)
+                yield sse({"token": token})
+        except Exception as e:
+            print(f"Narrative stream failed: {e!r}")
+            yield sse({"error": "Could not generate the CFO analysis."}, event='error')
+            return
+        # Reload the document: the request's session may already be closed once the stream ends.
+        save_report(db.session.get(AnalyzedDocument, document_id), 'narrative', "".join(tokens))
+        yield sse({"cached": False}, event='done')
+
+    return sse_response(events())
+
+
+@app.route("/api/cache-stats", methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Stats of the caches this worker has built so far; ones it has not needed yet are null."""
+    vector_store_cache = services.peek('vector_store_cache')
+    indexing_embeddings = services.peek('indexing_embeddings')
+    embedding_model = services.peek('embedding_model')
+    llm_cache = services.peek('llm_cache')
+    return jsonify({
+        "vector_store_cache": vector_store_cache and vector_store_cache.stats(),
+        "embedding_cache": indexing_embeddings and indexing_embeddings.cache.stats(),
+        "embedding_scheduler": embedding_model and embedding_model.stats(),
+        "llm_cache": llm_cache and llm_cache.stats(),
+        "llm_concurrency": llm_budget.stats(),
+        "upload_store": upload_store.stats(),
+        "services": services.stats()
+    })
 
-            df = pd.read_excel(file_path, sheet_name=ai_generated_map[key])
-            csv_for_sheet = df.to_csv(index=False)
 
-            raw_data = excel_chain.invoke({'sheet_context':csv_for_sheet, "metric_to_find":questions[key]})
-            if key == 'fiscal_year':
-                current_date = datetime.now()
-                extracted_excel_ans[key] = str(raw_data.value) or str(current_date.year)
-            else:
-                normalized_value = normalize_to_crore(raw_data)
-                extracted_excel_ans[key] = normalized_value
-        
-        print(extracted_excel_ans)
-        final_data = FinancialReportData(**extracted_excel_ans)
-        kpis = calculate_kpis(final_data)
+def cache_lookups():
+    """Hits and misses of the caches this worker has built, for /metrics."""
+    vector_store_cache = services.peek('vector_store_cache')
+    indexing_embeddings = services.peek('indexing_embeddings')
+    llm_cache = services.peek('llm_cache')
+    caches = {
+        "vector_store": vector_store_cache,
+        "embedding": indexing_embeddings and indexing_embeddings.cache,
+        "llm": llm_cache,
+    }
+    lookups = {}
+    for name, cache in caches.items():
+        if cache is not None:
+            lookups[(name, "hit")] = cache.hits
+            lookups[(name, "miss")] = cache.misses
+    return lookups
 
-        session['financial_data'] = kpis
-        prompt = PromptTemplate.from_template("""
-            Act as a Chief Financial Officer (CFO) tasked with presenting a financial health report to the company's board of directors. Your analysis must be clear, concise, and grounded in the data provided.
-            All financial figures are in **Indian Rupees (INR Crores)**. Your entire analysis, including all summaries, risks, and recommendations, must be presented in this context. Do not use the word 'dollars' or the '$' symbol.
-                                              
-            Based **only** on the following Key Performance Indicators (KPIs), generate a markdown-formatted report that includes the following three sections:
 
-            1.  **### Financial Summary**
-                A brief, high-level overview of the company's performance.
+telemetry.registry.collect('cache_lookups_total', "Cache lookups by cache and result.", cache_lookups, kind='counter', labelnames=['cache', 'result'])
+telemetry.registry.collect('llm_concurrency_in_flight', "Extraction LLM calls holding a concurrency slot.", lambda: llm_budget.stats()['in_flight'])
+telemetry.registry.collect('llm_concurrency_waiting', "Extraction LLM calls waiting for a concurrency slot.", lambda: llm_budget.stats()['waiting'])
 
-            2.  **### Key Risks & Opportunities**
-                A bulleted list identifying the most significant financial risks and potential opportunities, citing specific KPIs to support your points.
 
-            3.  **### Strategic Recommendations**
-                A bulleted list of 2-3 actionable recommendations for the leadership team to improve the company's financial position.
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """Prometheus text format: stage and LLM call latency histograms, token, error and cache counters of this worker."""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+    return Response(telemetry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
-            ---
-            **KPIs for Analysis:**
 
-            {kpis}
-        """)
+@app.route("/api/traces/<trace_id>", methods=['GET'])
+@login_required
+def get_trace(trace_id):
+    """The spans of a recent analysis job (trace id = job id) or ?trace=1 request, with per-stage totals."""
+    trace = telemetry.get_trace(trace_id)
+    if trace is None or trace.attributes.get('user_id') != current_user.id:
+        return jsonify({"error": "Trace not found. Only this worker's most recent traces are kept."}), 404
+    return jsonify(trace.to_dict())
+
+
+def portfolio_kpi_rows(user_id, document_hashes=None):
+    """KPIs of the user's analyzed reports (optionally only the given documents), one row per company and fiscal year, computed as one table."""
+    query = (
+        db.session.query(AnalyzedDocument.document_hash, AnalyzedDocument.filename, ExtractedFinancials)
+        .join(ExtractedFinancials, ExtractedFinancials.document_id == AnalyzedDocument.id)
+        .filter(AnalyzedDocument.user_id == user_id)
+    )
+    if document_hashes is not None:
+        query = query.filter(AnalyzedDocument.document_hash.in_(list(document_hashes)))
+    records = []
+    for document_hash, filename, financials in query.all():
+        figures = financials.as_dict()
+        # Metrics that failed extraction were stored as 0; treat them as unknown rather than zero.
+        for key in financials.failed_metrics or []:
+            figures[key] = None
+        records.append({"document_hash": document_hash, "filename": filename, **figures})
+    if not records:
+        return []
+
+    from kpi_engine import KEY_COLUMNS, compute_kpis, figures_frame, kpi_records
+    frame = figures_frame(records)
+    table = frame[["document_hash", "filename"] + KEY_COLUMNS].join(compute_kpis(frame))
+    return kpi_records(table.sort_values(KEY_COLUMNS, na_position='last'))
+
+
+@app.route("/api/portfolio/kpis", methods=['GET'])
+@login_required
+def get_portfolio_kpis():
+    return jsonify({"rows": portfolio_kpi_rows(current_user.id)})
 
-        prompt_final = prompt.invoke({'kpis':kpis})
-        final_analysis = model.invoke(prompt_final).content
 
-        final_response = {
-            "extracted_data": extracted_excel_ans,
-            "calculated_kpis": kpis,
-            "final_analysis": final_analysis
-        }
+@app.route("/api/financial-history", methods=['GET'])
+@login_required
+def get_financial_history():
+    """The stored figures of the user's company, one entry per fiscal year, oldest first."""
+    company_name = request.args.get('company') or current_user.company_name
+    history = financial_history(current_user.id, company_name)
+    return jsonify({
+        "company_name": company_name,
+        "years": [{"fiscal_year": fiscal_year, **history[fiscal_year]} for fiscal_year in sorted(history)]
+    })
 
-        return jsonify(final_response)
+
+@app.route("/api/jobs/<job_id>", methods=['GET'])
+@login_required
+def get_job_status(job_id):
+    job = job_store.get(job_id)
+    if not job or job['user_id'] != current_user.id:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify({
+        "job_id": job['id'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "result": job['result'],
+        "error": job['error'],
+        "trace_url": url_for('get_trace', trace_id=job_id) if telemetry.get_trace(job_id) else None
+    })
 
 
 
@@ -743,34 +1958,34 @@ class GetQueryResource(Resource):
     def post(self):
         identity = get_jwt_identity()
         user = User.query.filter_by(email=identity).first()
-        chat_messages = ChatMessage.query.filter_by(user_id=user.id).order_by(ChatMessage.timestamp).all()
-        chat_history_for_chain = []
-        for msg in chat_messages:
-            if msg.is_user_message:
-                chat_history_for_chain.append(HumanMessage(content=msg.message))
-            else:
-                chat_history_for_chain.append(AIMessage(content=msg.message))
+        chat_history_for_chain, pending_summary = load_chat_history(user.id)
         data = request.get_json()
         query = data.get('query')
-        result = model.invoke(query)
+        from langchain_core.messages import HumanMessage
+        result = services.chat_model.invoke(chat_history_for_chain + [HumanMessage(content=query)])
+        record_chat_turn(user.id, query, result.content, pending_summary)
         return result.content
 
 class UploadAnnualReportPdf(Resource):
     # @jwt_required()
     def post(self):
-        if 'pdf_file' not in request.files:
+        try:
+            files = request.files
+        except UploadTooLargeError as e:
+            return {'message': str(e)}, 413
+        if 'pdf_file' not in files:
             return 'No files passed!'
 
-        file = request.files['pdf_file']
+        file = files['pdf_file']
         
         if file.filename == "":
             return 'No file selected!'
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(save_path)
-            return f"File {filename} uploaded successfully!"
+            stored = store_upload(file, current_user.id if current_user.is_authenticated else None)
+            job_id = job_runner.submit('index', lambda report_progress: {"document_hash": index_uploaded_file(stored.path, stored.sha256)}, payload={"file_path": stored.path})
+            return {'message': f"File {filename} uploaded successfully!", 'job_id': job_id}
         else:
             return "invlaid file type. Only pdfs are allowed."
 
@@ -794,6 +2009,9 @@ api.add_resource(UploadAnnualReportPdf, '/api/uploadAnnualReportPdf')
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        # create_all skips indexes on tables that already exist
+        for index in ChatMessage.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
         if not User.query.filter_by(work_email="admin@gmail.com").first():
             admin_user = User(id=0,full_name="Admin", work_email="admin@gmail.com", job_title="admin")
             admin_user.set_password("admin123") 
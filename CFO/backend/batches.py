@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+from jobs import QUEUED, RUNNING, SUCCEEDED, FAILED
+
+
+COMPLETED_WITH_ERRORS = 'completed_with_errors'
+DEFAULT_BATCH_WORKERS = 4
+
+
+class BatchStore:
+    """
+    SQLite-backed record of analysis batches: one row per batch and one per document in it,
+    with each document's status, current stage, error and attempt count. Lives next to the
+    job table, so a batch survives a restart and can be resumed where it stopped.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER,
+                    options TEXT NOT NULL DEFAULT '{}',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_item (
+                    batch_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    file_path TEXT NOT NULL,
+                    filename TEXT,
+                    company_name TEXT,
+                    document_hash TEXT,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (batch_id, position)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_batch_user_created ON batch (user_id, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, user_id=None, options=None) -> str:
+        batch_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO batch (id, user_id, options, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (batch_id, user_id, json.dumps(options or {}), now, now),
+            )
+        return batch_id
+
+    def add_items(self, batch_id: str, items: Iterable[dict]):
+        """items: dicts with file_path and optionally filename and company_name, queued in the given order."""
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO batch_item (batch_id, position, file_path, filename, company_name, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(batch_id, position, item['file_path'], item.get('filename'), item.get('company_name'), QUEUED, now) for position, item in enumerate(items)],
+            )
+
+    def delete(self, batch_id: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM batch_item WHERE batch_id = ?", (batch_id,))
+            conn.execute("DELETE FROM batch WHERE id = ?", (batch_id,))
+
+    def update_item(self, batch_id: str, position: int, **fields):
+        fields['updated_at'] = datetime.utcnow().isoformat()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE batch_item SET {columns} WHERE batch_id = ? AND position = ?", (*fields.values(), batch_id, position))
+            conn.execute("UPDATE batch SET updated_at = ? WHERE id = ?", (fields['updated_at'], batch_id))
+
+    def items(self, batch_id: str, statuses: Optional[Iterable[str]] = None) -> List[dict]:
+        query = "SELECT * FROM batch_item WHERE batch_id = ?"
+        params = [batch_id]
+        if statuses is not None:
+            statuses = list(statuses)
+            query += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query + " ORDER BY position", params)]
+
+    def get(self, batch_id: str):
+        """The batch with its items and a status derived from theirs."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM batch WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = dict(row)
+        batch['options'] = json.loads(batch['options'])
+        batch['items'] = self.items(batch_id)
+        counts = {state: 0 for state in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        for item in batch['items']:
+            counts[item['status']] += 1
+        batch['counts'] = counts
+        if counts[QUEUED] or counts[RUNNING]:
+            batch['status'] = RUNNING
+        else:
+            batch['status'] = COMPLETED_WITH_ERRORS if counts[FAILED] else SUCCEEDED
+        return batch
+
+    def requeue_interrupted(self) -> int:
+        """Puts documents left running by a previous process back in the queue, to be picked up by a resume."""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE batch_item SET status = ?, stage = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, 'interrupted', datetime.utcnow().isoformat(), RUNNING),
+            )
+            return cursor.rowcount
+
+
+class BatchRunner:
+    """
+    Works through batch documents on its own thread pool, separate from the dashboard's
+    job pool, so a 200-report import does not hold up interactive analyses. process(item,
+    report_progress) does the work for one document (the item carries its batch's user_id
+    and options) and returns its document hash.
+    """
+
+    def __init__(self, store: BatchStore, process: Callable[[dict, Callable[[dict], None]], str], max_workers: int = DEFAULT_BATCH_WORKERS):
+        self.store = store
+        self.process = process
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="batch")
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def start(self, batch_id: str, retry_failed: bool = False) -> int:
+        """
+        Queues every document of the batch that is not done and not already being worked
+        on; with retry_failed, failed documents get another attempt. Returns how many were queued.
+        """
+        batch = self.store.get(batch_id)
+        if batch is None:
+            return 0
+        statuses = (QUEUED, RUNNING, FAILED) if retry_failed else (QUEUED, RUNNING)
+        queued = 0
+        for item in batch['items']:
+            if item['status'] not in statuses:
+                continue
+            item = dict(item, user_id=batch['user_id'], options=batch['options'])
+            key = (batch_id, item['position'])
+            with self._lock:
+                if key in self._in_flight:
+                    continue
+                self._in_flight.add(key)
+            self.store.update_item(batch_id, item['position'], status=QUEUED, error=None)
+            self.executor.submit(self._run, item)
+            queued += 1
+        return queued
+
+    def _run(self, item: dict):
+        batch_id, position = item['batch_id'], item['position']
+        self.store.update_item(batch_id, position, status=RUNNING, stage=None, attempts=item['attempts'] + 1)
+        try:
+            document_hash = self.process(item, lambda event: self.store.update_item(batch_id, position, stage=event.get('stage')))
+        except Exception as exc:
+            traceback.print_exc()
+            self.store.update_item(batch_id, position, status=FAILED, error=f"{type(exc).__name__}: {exc}")
+        else:
+            self.store.update_item(batch_id, position, status=SUCCEEDED, stage=None, document_hash=document_hash)
+        finally:
+            with self._lock:
+                self._in_flight.discard((batch_id, position))
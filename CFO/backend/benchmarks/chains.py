@@ -0,0 +1,90 @@
+"""
+Micro-benchmark for the prebuilt chains in app.py.
+
+Before the chains were registered as services, every request put its prompt templates and
+with_structured_output wrappers together again, which converts the pydantic schema into
+Gemini tool definitions each time. This measures that setup per chain, rebuilt (what a
+request used to pay) against shared (a registry lookup), and adds it up per route:
+
+    cd CFO/backend
+    python benchmarks/chains.py --iterations 200 --output chains.json
+
+Nothing is sent to Gemini; a placeholder GOOGLE_API_KEY is used if none is set.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Chains each route used to build on every request.
+ROUTE_CHAINS = {
+    "get_dashboard_data (PDF, per_metric)": ["pdf_metric_chain", "pdf_answer_chain", "narrative_chain"],
+    "get_dashboard_data (Excel fallback)": ["excel_sheet_map_chain", "excel_metric_chain", "narrative_chain"],
+    "get_risk_analysis": ["risk_chain"],
+    "chat_bot": ["insights_chat_chain"],
+}
+
+
+def per_call_ms(call, iterations: int) -> float:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import app
+    services = app.services
+    services.model, services.chat_model  # clients are built once either way
+
+    def rebuild(name):
+        services.reset(name)
+        services.get(name)
+
+    chain_names = sorted({name for names in ROUTE_CHAINS.values() for name in names})
+    chains = {}
+    for name in chain_names:
+        rebuild(name)  # warm up imports
+        chains[name] = {
+            "rebuilt_ms": round(per_call_ms(lambda: rebuild(name), args.iterations), 4),
+            "shared_ms": round(per_call_ms(lambda: services.get(name), args.iterations), 4),
+        }
+    routes = {
+        route: {
+            "rebuilt_ms": round(sum(chains[name]["rebuilt_ms"] for name in names), 3),
+            "shared_ms": round(sum(chains[name]["shared_ms"] for name in names), 3),
+        }
+        for route, names in ROUTE_CHAINS.items()
+    }
+    report = {
+        "benchmark": "chains",
+        "python": platform.python_version(),
+        "iterations": args.iterations,
+        "chains": chains,
+        "routes": routes,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Deterministic local stand-ins for the Gemini chat and embedding models, for benchmarks
+that must not call the API. Responses depend only on the prompt, latency is injected per
+call, and every call is counted together with a token estimate of its prompt and answer.
+"""
+import hashlib
+import threading
+import time
+import typing
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, Field
+
+from chat_memory import estimate_tokens
+from embedding_scheduler import DEFAULT_MAX_BATCH_SIZE, EmbeddingScheduler
+
+
+NARRATIVE_TEXT = (
+    "### Financial Summary\n"
+    "Revenue grew strongly while margins stayed thin, and operating cash flow remained negative.\n\n"
+    "### Key Risks & Opportunities\n"
+    "* Cash burn shortens the runway if revenue growth slows.\n"
+    "* A healthy current ratio leaves room to fund working capital.\n\n"
+    "### Strategic Recommendations\n"
+    "* Tighten working capital to bring operating cash flow positive.\n"
+    "* Prioritise the highest-margin revenue streams.\n"
+)
+ANSWER_TEXT = (
+    "Based on the figures provided, revenue grew year on year and the company is profitable, "
+    "but operating activities consumed cash, so the monthly burn rate and runway deserve attention. "
+    "The current ratio is comfortable and leverage is moderate."
+)
+
+
+class ModelUsage:
+    """Call and token counts of a fake model, safe to update from the extraction threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls_by_kind: Dict[str, int] = {}
+
+    def record(self, kind: str, prompt: str, completion: str):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+            self.completion_tokens += estimate_tokens(completion)
+            self.calls_by_kind[kind] = self.calls_by_kind.get(kind, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "model_calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "calls_by_kind": dict(sorted(self.calls_by_kind.items())),
+            }
+
+
+def _seed(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("\x00".join(parts).encode('utf-8')).digest()[:8], 'big')
+
+
+def fake_value(annotation, name: str, prompt: str):
+    """A deterministic value of the given type for field name, derived from the prompt."""
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is typing.Union:
+        return fake_value(next(arg for arg in args if arg is not type(None)), name, prompt)
+    if origin is typing.Literal:
+        return args[0]
+    if origin in (list, List):
+        return [fake_value(args[0] if args else str, name, prompt)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, prompt, name)
+    seed = _seed(name, prompt)
+    if annotation is float:
+        return float(seed % 2000000) / 100
+    if annotation is int:
+        return seed % 100
+    if name == 'fiscal_year':
+        return "FY24"
+    return f"{name.replace('_', ' ')} {seed % 1000}"
+
+
+def fake_instance(schema, prompt: str, prefix: str = ""):
+    """An instance of a pydantic schema with every field filled deterministically."""
+    return schema(**{
+        name: fake_value(field.annotation, f"{prefix}.{name}", prompt)
+        for name, field in schema.model_fields.items()
+    })
+
+
+def usage_metadata(prompt: str, completion: str) -> dict:
+    """Token usage as Gemini reports it on a response, estimated locally."""
+    input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(completion)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+def prompt_text(prompt) -> str:
+    if hasattr(prompt, 'to_string'):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return "\n".join(str(message.content) for message in prompt)
+    return str(prompt)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Stand-in for ChatGoogleGenerativeAI. Text calls return a fixed narrative or answer
+    (streamed word by word), with_structured_output(schema) returns schema instances filled
+    from a hash of the prompt, or from structured_responses[schema](prompt) when given.
+    Each call sleeps latency seconds before answering.
+    """
+
+    latency: float = 0.0
+    structured_responses: Dict[Any, Callable[[str], Any]] = Field(default_factory=dict)
+    usage: Any = Field(default_factory=ModelUsage)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def _answer(self, prompt: str) -> str:
+        if "KPIs for Analysis" in prompt:
+            return NARRATIVE_TEXT
+        if "Respond with only the answer" in prompt:
+            return "FY24"
+        if "UPDATED SUMMARY" in prompt:
+            return "The finance team asked about growth, margins and cash burn; the assistant summarised each KPI."
+        return ANSWER_TEXT
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = prompt_text(messages)
+        time.sleep(self.latency)
+        answer = self._answer(prompt)
+        self.usage.record("text", prompt, answer)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer, usage_metadata=usage_metadata(prompt, answer)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        prompt = prompt_text(messages)
+        time.sleep(self.latency)
+        answer = self._answer(prompt)
+        self.usage.record("text", prompt, answer)
+        words = answer.split(" ")
+        for position, word in enumerate(words):
+            # Like Gemini, the usage comes with the last chunk.
+            usage = usage_metadata(prompt, answer) if position == len(words) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if position == 0 else " " + word, usage_metadata=usage))
+
+    def with_structured_output(self, schema, **kwargs):
+        respond = self.structured_responses.get(schema)
+
+        def invoke(prompt):
+            text = prompt_text(prompt)
+            time.sleep(self.latency)
+            result = respond(text) if respond else fake_instance(schema, text)
+            self.usage.record(f"structured:{schema.__name__}", text, result.model_dump_json())
+            return result
+
+        return RunnableLambda(invoke)
+
+
+class FakeRateLimitError(Exception):
+    """What FakeEmbeddingBackend raises when its simulated quota is exceeded (mirrors a 429)."""
+
+
+class FakeEmbeddingBackend(Embeddings):
+    """
+    Local stand-in for the embedding API: deterministic vectors derived from each text's hash,
+    optional per-request latency, and a simulated requests-per-minute quota that raises
+    FakeRateLimitError like the real API. Select it with EMBEDDING_BACKEND=fake.
+    """
+
+    model = 'fake-embedding'
+
+    def __init__(self, size: int = 768, latency: float = 0.0, quota_per_minute: Optional[int] = None, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        self.size = size
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.max_batch_size = max_batch_size
+        self.calls = 0
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _request(self, count: int):
+        with self._lock:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= 60:
+                self._calls.popleft()
+            if self.quota_per_minute and len(self._calls) >= self.quota_per_minute:
+                raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota).")
+            if count > self.max_batch_size:
+                raise ValueError(f"At most {self.max_batch_size} texts per request, got {count}.")
+            self._calls.append(now)
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._request(len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._request(1)
+        return self._vector(text)
+
+
+def fake_embedding_model(latency: float = 0.0, size: int = 768) -> EmbeddingScheduler:
+    """The app's embedding scheduler in front of the local fake backend, so batching and request counts match production."""
+    return EmbeddingScheduler(FakeEmbeddingBackend(size=size, latency=latency))
@@ -0,0 +1,185 @@
+"""
+Synthetic inputs for the pipeline benchmark: an annual-report PDF with a cover, a table
+of contents and the three consolidated statements among boilerplate pages, and an Excel
+workbook laid out like CFO/sample_data_excel.xlsx. Both are generated, so the benchmark
+needs no real reports and every run sees the same bytes.
+"""
+from typing import Dict, List, Tuple
+
+
+# Printed page numbers run one behind the PDF index, as in reports with an unnumbered cover.
+PRINTED_PAGE_OFFSET = 1
+STATEMENT_LINES = {
+    "consolidated_profit_loss": [
+        "Consolidated Statement of Profit and Loss",
+        "Particulars FY24 FY23",
+        "Revenue from operations 14,500 9,800",
+        "Other income 950 720",
+        "Total income 15,450 10,520",
+        "Profit / (loss) for the year 550 (980)",
+    ],
+    "consolidated_balance_sheet": [
+        "Consolidated Balance Sheet",
+        "Particulars FY24 FY23",
+        "Total current assets 6,500 8,800",
+        "Total equity 12,000 11,450",
+        "Total current liabilities 2,300 2,350",
+        "Total liabilities 5,500 6,850",
+    ],
+    "consolidated_cash_flow": [
+        "Consolidated Cash Flow Statement",
+        "Particulars FY24 FY23",
+        "Net cash generated from / (used in) operating activities (600) (750)",
+        "Cash and cash equivalents at the end of the year 15,200 14,100",
+    ],
+}
+# Where each metric is in the fixture workbook, as the sheet-mapping call should answer.
+WORKBOOK_METRIC_SHEETS = {
+    "company_name": "summary",
+    "fiscal_year": "summary",
+    "cash_reserves": "summary",
+    "revenue_current_year": "consolidated p&l",
+    "revenue_previous_year": "consolidated p&l",
+    "profit_after_tax_current_year": "consolidated p&l",
+    "profit_after_tax_previous_year": "consolidated p&l",
+    "total_liabilities": "consolidated balance sheet",
+    "total_current_assets": "consolidated balance sheet",
+    "total_current_liabilities": "consolidated balance sheet",
+    "total_equity": "consolidated balance sheet",
+    "net_cash_from_operations": "consolidated cash flow",
+}
+BOILERPLATE = (
+    "The Board remains committed to responsible growth, strong governance and transparent reporting. "
+    "Our sustainability programmes, risk management framework and people initiatives are described in this section. "
+)
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """A minimal text-only PDF (Helvetica, one line per entry) that pypdf can extract."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # the page tree, once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = stream.encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_numbers.append(len(objects))
+    kids = " ".join(f"{number} 0 R" for number in page_numbers).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_numbers))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def annual_report_pages(page_count: int = 120) -> Tuple[List[List[str]], Dict[str, Tuple[int, int]]]:
+    """
+    Page texts of a synthetic annual report and the printed page range of each statement,
+    as its table of contents lists them. The statements sit two thirds of the way in.
+    """
+    if page_count < 12:
+        raise ValueError("An annual report fixture needs at least 12 pages.")
+    first = page_count * 2 // 3
+    printed_ranges = {
+        section: (first + 2 * position, first + 2 * position + 1)
+        for position, section in enumerate(STATEMENT_LINES)
+    }
+    statement_pages = {start + PRINTED_PAGE_OFFSET: section for section, (start, _) in printed_ranges.items()}
+    pages = [
+        ["Bench Dynamics Limited", "Annual Report FY24"],
+        ["Table of Contents", "Chairman's message 3", "Sustainability report 5",
+         f"Consolidated Statement of Profit and Loss {printed_ranges['consolidated_profit_loss'][0]}",
+         f"Consolidated Balance Sheet {printed_ranges['consolidated_balance_sheet'][0]}",
+         f"Consolidated Cash Flow Statement {printed_ranges['consolidated_cash_flow'][0]}",
+         f"Notes to the financial statements {first + 6}"],
+    ]
+    for index in range(2, page_count):
+        printed = index - PRINTED_PAGE_OFFSET
+        if index in statement_pages:
+            pages.append(STATEMENT_LINES[statement_pages[index]] + [f"Page {printed}"])
+        else:
+            pages.append([BOILERPLATE * 3, f"Page {printed}"])
+    return pages, printed_ranges
+
+
+def write_annual_report(path: str, page_count: int = 120) -> Dict[str, Tuple[int, int]]:
+    """Writes the synthetic report and returns its statements' printed page ranges."""
+    pages, printed_ranges = annual_report_pages(page_count)
+    write_pdf(path, pages)
+    return printed_ranges
+
+
+def write_financial_workbook(path: str, company_name: str = "Bench Dynamics Inc."):
+    """A workbook with the sheets and line items of sample_data_excel.xlsx."""
+    from openpyxl import Workbook
+
+    header = ["Particulars", "FY25 (in Crores)", "FY24 (in Crores)"]
+    sheets = {
+        "summary": [
+            ["A", "B"],
+            ["Company Name", company_name],
+            ["Report for Fiscal Year", "FY25"],
+            ["Consolidated Cash Balance", "15,200 Crores"],
+            ["Key Metrics (in Crores)", "Value"],
+            ["Revenue (FY25)", 14500],
+            ["Profit After Tax (FY25)", 550],
+        ],
+        "consolidated p&l": [
+            header,
+            ["Revenue from operations", 14500, 9800],
+            ["Other Income", 950, 720],
+            ["Total Income", 15450, 10520],
+            ["Expenses", 14200, 11200],
+            ["Profit / (loss) before tax", 1250, -680],
+            ["Tax Expense", 700, 300],
+            ["Profit / (loss) for the year", 550, -980],
+        ],
+        "consolidated balance sheet": [
+            header,
+            ["Assets", None, None],
+            ["Non-current assets", 11000, 9500],
+            ["Total current assets", 6500, 8800],
+            ["Total Assets", 17500, 18300],
+            ["Equity and Liabilities", None, None],
+            ["Total equity", 12000, 11450],
+            ["Non-current liabilities", 3200, 4500],
+            ["Total current liabilities", 2300, 2350],
+            ["Total Liabilities", 5500, 6850],
+            ["Total Equity & Liabilities", 17500, 18300],
+        ],
+        "consolidated cash flow": [
+            header,
+            ["Cash flow from operating activities", 900, -750],
+            ["Cash flow from investing activities", -400, 250],
+            ["Cash flow from financing activities", 150, 600],
+            ["Net cash generated from / (used in) operating activities", -600, -750],
+        ],
+        "standalone p&l": [
+            header,
+            ["Revenue from operations", 9200, 6100],
+            ["Profit / (loss) for the year", 150, -400],
+        ],
+    }
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for title, rows in sheets.items():
+        sheet = workbook.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
@@ -0,0 +1,299 @@
+"""
+Offline end-to-end benchmark of the analysis pipeline.
+
+Runs the app's own code paths with the Gemini chat and embedding models replaced by the
+deterministic fakes in fakes.py (with injected latency), on generated fixtures (see
+fixtures.py), and reports per scenario the wall time, model calls, prompt and completion
+tokens, embedding requests and peak RSS as JSON:
+
+    cd CFO/backend
+    python benchmarks/pipeline.py --output pipeline.json
+    python benchmarks/pipeline.py --scenarios pdf_per_metric excel_per_metric --llm-latency 0.2
+    python benchmarks/pipeline.py --baseline pipeline.json   # prints the change against an earlier report
+
+Scenarios:
+  index_build         upload-time indexing of the fixture PDF (TOC pass, document map, selective
+                      page extraction and embedding), as preprocess.py does, into an empty index
+                      and embedding cache
+  pdf_per_metric      get_dashboard_data's analysis of the PDF, one extraction call per metric
+  pdf_batched         the same with one structured call for all metrics
+  excel_per_metric    analysis of the fixture workbook (table parser, LLM only where it is unsure)
+  excel_batched       the same in batched mode
+  excel_llm_fallback  the workbook with the table parser disabled, so every metric goes to the LLM
+  chat_turns          POSTs to /chatbot/insights, including the background history summaries
+                      once the conversation outgrows CHAT_HISTORY_MAX_TOKENS
+  risk_analysis       POST /api/get-risk-analysis for an analyzed report
+
+Each scenario runs in its own process, so peak RSS is per scenario. Pipeline modules are
+imported and the PDF index is built in an untimed setup step, so the timings leave out
+cold imports (see startup.py). Nothing leaves the machine and no API key is needed.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+SCENARIOS = [
+    "index_build", "pdf_per_metric", "pdf_batched", "excel_per_metric", "excel_batched",
+    "excel_llm_fallback", "chat_turns", "risk_analysis",
+]
+# Compared against a baseline report; for all of them lower is better.
+COMPARED_METRICS = ["wall_seconds", "model_calls", "prompt_tokens", "embedding_requests", "peak_rss_mb"]
+REPORT_PDF = "annual_report.pdf"
+WORKBOOK = "financials.xlsx"
+COMPANY_NAME = "Bench Dynamics Ltd"
+# Imported during setup, so wall times measure the pipeline rather than the first-use imports
+# that benchmarks/startup.py keeps track of.
+PIPELINE_MODULES = [
+    "indexing", "document_map", "hybrid_retrieval", "table_parser", "workbook", "kpi_engine", "llm_cache",
+    "langchain_core.prompts", "langchain_core.output_parsers", "langchain_community.vectorstores", "langchain.text_splitter",
+]
+
+
+# --- scenario process -------------------------------------------------------------------
+
+def load_app(args):
+    """Imports the app against the benchmark's data directory with the fake models in place."""
+    os.environ['CFO_DATA_DIR'] = os.path.join(args.workdir, "data")
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    for module in PIPELINE_MODULES:
+        importlib.import_module(module)
+    from document_map import DocumentMap, PageRange
+    from fakes import FakeChatModel, fake_embedding_model
+    from fixtures import WORKBOOK_METRIC_SHEETS
+
+    with open(os.path.join(args.workdir, "document_map.json")) as f:
+        printed_ranges = json.load(f)
+    document_map = DocumentMap(**{
+        section: PageRange(start_page=start, end_page=end) for section, (start, end) in printed_ranges.items()
+    })
+    sheet_map = app.FinancialDataLocationMap(**WORKBOOK_METRIC_SHEETS)
+    model = FakeChatModel(latency=args.llm_latency, structured_responses={
+        DocumentMap: lambda prompt: document_map,
+        app.FinancialDataLocationMap: lambda prompt: sheet_map,
+    })
+    app.services.override('model', model)
+    app.services.override('chat_model', model)
+    app.services.override('embedding_model', fake_embedding_model(latency=args.embedding_latency))
+    app.app.config['EXTRACTION_CALL_TIMEOUT'] = max(app.app.config['EXTRACTION_CALL_TIMEOUT'], args.llm_latency * 20)
+    return app, model
+
+
+def usage(app, model) -> dict:
+    counts = model.usage.snapshot()
+    embeddings = app.services.embedding_model.stats()
+    counts["embedding_requests"] = embeddings["requests"]
+    counts["texts_embedded"] = embeddings["texts_embedded"]
+    return counts
+
+
+def analyzed_user(app, args):
+    """A logged-in test client for a user whose workbook analysis is stored and selected in the session."""
+    workbook = os.path.join(args.workdir, WORKBOOK)
+    with app.app.app_context():
+        app.db.create_all()
+        user = app.User.query.filter_by(work_email="bench@example.com").first()
+        if user is None:
+            user = app.User(full_name="Bench", work_email="bench@example.com", job_title="cfo", company_name=COMPANY_NAME)
+            user.set_password("bench")
+            app.db.session.add(user)
+            app.db.session.commit()
+        from indexing import file_sha256
+        document_hash = file_sha256(workbook)
+        app.save_analysis(user.id, document_hash, workbook, app.analyze_document(workbook, COMPANY_NAME, 'per_metric'))
+    client = app.app.test_client()
+    client.post('/login', data={'work_email': "bench@example.com", 'password': "bench", 'job_title': "cfo"})
+    with client.session_transaction() as session:
+        session['document_hash'] = document_hash
+    return client
+
+
+def prepare(name: str, app, args):
+    """Untimed setup; returns the timed step."""
+    report = os.path.join(args.workdir, REPORT_PDF)
+    workbook = os.path.join(args.workdir, WORKBOOK)
+
+    if name == "index_build":
+        cold_dir = tempfile.mkdtemp(prefix="cold-", dir=args.workdir)
+        app.FAISS_INDEX_ROOT = os.path.join(cold_dir, "faiss_index")
+        app.EMBEDDING_CACHE_DIR = os.path.join(cold_dir, "embedding_cache")
+        return lambda: {"document_hash": app.index_uploaded_file(report)}
+
+    if name in ("pdf_per_metric", "pdf_batched"):
+        app.index_uploaded_file(report)
+        mode = name.split("_", 1)[1]
+        return lambda: {"failed_metrics": app.analyze_document(report, COMPANY_NAME, mode)["failed_metrics"]}
+
+    if name in ("excel_per_metric", "excel_batched", "excel_llm_fallback"):
+        if name == "excel_llm_fallback":
+            app.app.config['TABLE_PARSER_MIN_CONFIDENCE'] = 1.01
+        mode = 'batched' if name == "excel_batched" else 'per_metric'
+        return lambda: {"failed_metrics": app.analyze_document(workbook, COMPANY_NAME, mode)["failed_metrics"]}
+
+    if name == "chat_turns":
+        client = analyzed_user(app, args)
+
+        def chat():
+            statuses = [
+                client.post('/chatbot/insights', json={'message': f"Question {turn}: how is our runway and margin trending?"}).status_code
+                for turn in range(args.chat_turns)
+            ]
+            # History summaries run as background jobs; they are part of what a conversation costs.
+            app.job_runner.executor.shutdown(wait=True)
+            return {"turns": args.chat_turns, "status_codes": sorted(set(statuses))}
+        return chat
+
+    if name == "risk_analysis":
+        client = analyzed_user(app, args)
+        return lambda: {"status_code": client.post('/api/get-risk-analysis?refresh=1').status_code}
+
+    raise ValueError(f"Unknown scenario '{name}'.")
+
+
+def run_scenario(name: str, args) -> dict:
+    app, model = load_app(args)
+    step = prepare(name, app, args)
+    before = usage(app, model)
+    started = time.perf_counter()
+    outcome = step()
+    wall = time.perf_counter() - started
+    after = usage(app, model)
+    # Reaps the PDF extraction workers so their memory shows up in children_peak_rss_mb.
+    from pdf_pages import shutdown_extraction_pool
+    shutdown_extraction_pool()
+
+    result = {"wall_seconds": round(wall, 4)}
+    for key in ("model_calls", "prompt_tokens", "completion_tokens", "embedding_requests", "texts_embedded"):
+        result[key] = after[key] - before[key]
+    result["calls_by_kind"] = {
+        kind: count - before["calls_by_kind"].get(kind, 0)
+        for kind, count in after["calls_by_kind"].items() if count != before["calls_by_kind"].get(kind, 0)
+    }
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    result["children_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    result["outcome"] = outcome
+    return result
+
+
+# --- driver -----------------------------------------------------------------------------
+
+def write_fixtures(args):
+    from fixtures import write_annual_report, write_financial_workbook
+    printed_ranges = write_annual_report(os.path.join(args.workdir, REPORT_PDF), args.pages)
+    with open(os.path.join(args.workdir, "document_map.json"), 'w') as f:
+        json.dump(printed_ranges, f)
+    write_financial_workbook(os.path.join(args.workdir, WORKBOOK))
+
+
+def scenario_process(name: str, args) -> dict:
+    command = [
+        sys.executable, os.path.abspath(__file__), "--run-scenario", name, "--workdir", args.workdir,
+        "--llm-latency", str(args.llm_latency), "--embedding-latency", str(args.embedding_latency),
+        "--chat-turns", str(args.chat_turns),
+    ]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stdout[-2000:] + completed.stderr[-4000:])
+        raise RuntimeError(f"Scenario {name} failed with exit code {completed.returncode}.")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs) -> dict:
+    """The median run by wall time, with the spread of wall times when repeated."""
+    ordered = sorted(runs, key=lambda run: run["wall_seconds"])
+    result = dict(ordered[(len(ordered) - 1) // 2])
+    if len(runs) > 1:
+        walls = [run["wall_seconds"] for run in runs]
+        result["wall_seconds"] = round(statistics.median(walls), 4)
+        result["wall_seconds_runs"] = walls
+        result["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict) -> str:
+    lines = [f"{'scenario':<20} {'metric':<20} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for name, result in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            lines.append(f"{name:<20} {metric:<20} {old:>12} {new:>12} {change:>8}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake model call")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="seconds per fake embedding request")
+    parser.add_argument("--pages", type=int, default=120, help="pages in the fixture PDF")
+    parser.add_argument("--chat-turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; the median is reported")
+    parser.add_argument("--workdir", help="fixtures and app data go here (default: a temporary directory)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(args.run_scenario, args)))
+        return
+
+    temporary = args.workdir is None
+    args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="cfo-bench-"))
+    os.makedirs(args.workdir, exist_ok=True)
+    try:
+        write_fixtures(args)
+        scenarios = {}
+        for name in args.scenarios:
+            scenarios[name] = summarize([scenario_process(name, args) for _ in range(max(1, args.repeat))])
+            print(f"{name}: {scenarios[name]['wall_seconds']}s, {scenarios[name]['model_calls']} model calls", file=sys.stderr)
+    finally:
+        if temporary:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "settings": {
+            "llm_latency": args.llm_latency, "embedding_latency": args.embedding_latency,
+            "pdf_pages": args.pages, "chat_turns": args.chat_turns, "repeat": args.repeat,
+        },
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cold-start benchmark for the Flask app.
+
+Each run starts a fresh interpreter, imports app.py and serves one request (the login
+page by default) through the test client, then reports how long the import and the first
+request took, the peak RSS and which heavy libraries ended up loaded. Several runs are
+summarized as min / median / max and written as JSON, so results can be compared across
+commits:
+
+    cd CFO/backend
+    python benchmarks/startup.py --runs 5 --output startup.json
+    python benchmarks/startup.py --max-import-seconds 1.0   # exits 1 if the median is slower
+
+No API key or network access is needed: models and chains are only built on first use.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Libraries a request that does not touch the LLM pipeline should not have to import.
+HEAVY_MODULES = [
+    "langchain_core", "langchain", "langchain_community", "langchain_google_genai",
+    "google.generativeai", "faiss", "pandas", "numpy", "pypdf", "openpyxl",
+]
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+response = client.get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_request_seconds": served - imported,
+    "status_code": response.status_code,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules_loaded": [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+
+def run_once(path: str) -> dict:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD, path, *HEAVY_MODULES],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - started
+    return result
+
+
+def summarize(values) -> dict:
+    return {"min": round(min(values), 4), "median": round(statistics.median(values), 4), "max": round(max(values), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/login", help="route requested after the import")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--max-import-seconds", type=float, help="fail if the median import time is above this")
+    args = parser.parse_args()
+
+    runs = [run_once(args.path) for _ in range(max(1, args.runs))]
+    report = {
+        "benchmark": "startup",
+        "python": platform.python_version(),
+        "path": args.path,
+        "runs": len(runs),
+        "status_codes": sorted({run["status_code"] for run in runs}),
+        "heavy_modules_loaded": sorted({name for run in runs for name in run["heavy_modules_loaded"]}),
+    }
+    for metric in ("import_seconds", "first_request_seconds", "process_seconds", "peak_rss_mb"):
+        report[metric] = summarize([run[metric] for run in runs])
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if args.max_import_seconds is not None and report["import_seconds"]["median"] > args.max_import_seconds:
+        print(f"Median import time {report['import_seconds']['median']}s is above {args.max_import_seconds}s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+from typing import Callable, Optional, Sequence, Tuple
+
+
+DEFAULT_WINDOW_TOKENS = 2000
+DEFAULT_FETCH_LIMIT = 40
+DEFAULT_SUMMARY_MIN_MESSAGES = 6
+DEFAULT_SUMMARY_BATCH = 40
+# Roughly four characters per token for English text, plus a few tokens of per-message framing.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; counting with the model would cost an API call per message."""
+    return len(text or "") // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def token_window(newest_first: Sequence, max_tokens: int) -> Tuple[list, list]:
+    """
+    Splits messages (newest first, each with a .message attribute) into the most recent ones
+    that fit in max_tokens and the older remainder. Both lists are returned oldest first.
+    The newest message is always kept, even if it alone is over budget.
+    """
+    kept, used = [], 0
+    for position, msg in enumerate(newest_first):
+        cost = estimate_tokens(msg.message)
+        if kept and used + cost > max_tokens:
+            return kept[::-1], list(newest_first[position:])[::-1]
+        kept.append(msg)
+        used += cost
+    return kept[::-1], []
+
+
+def to_chat_messages(messages: Sequence) -> list:
+    from langchain_core.messages import AIMessage, HumanMessage
+    return [HumanMessage(content=msg.message) if msg.is_user_message else AIMessage(content=msg.message) for msg in messages]
+
+
+def build_history(summary: Optional[str], window: Sequence) -> list:
+    """Chat history for a prompt: the rolling summary of older turns, then the recent window verbatim."""
+    from langchain_core.messages import SystemMessage
+    history = []
+    if summary:
+        history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    return history + to_chat_messages(window)
+
+
+def format_transcript(messages: Sequence) -> str:
+    return "\n".join(f"{'User' if msg.is_user_message else 'Assistant'}: {msg.message}" for msg in messages)
+
+
+def fold_into_summary(summarize: Callable[[dict], str], summary: Optional[str], messages: Sequence) -> str:
+    """Asks the summarize chain to merge older messages into the running summary."""
+    return summarize({"summary": summary or "(none yet)", "messages": format_transcript(messages)}).strip()
+
+
+class SingleFlight:
+    """Tracks keys with work in progress so a second request for the same key is skipped, not queued."""
+
+    def __init__(self):
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def acquire(self, key) -> bool:
+        with self._lock:
+            if key in self._active:
+                return False
+            self._active.add(key)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._active.discard(key)
@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import threading
+import weakref
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+from pydantic import BaseModel, Field
+
+
+TOC_SCAN_PAGES = 20
+COVER_PAGES = 3
+DEFAULT_PAGE_MARGIN = 1
+OFFSET_SEARCH_RADIUS = 40
+MAP_FILENAME = 'document_map.json'
+
+# Titles printed at the top of each statement, used to line TOC page numbers up with PDF pages.
+SECTION_TITLES = {
+    "consolidated_profit_loss": re.compile(r"consolidated\s+statement\s+of\s+profit\s+(and|&)\s+loss", re.IGNORECASE),
+    "consolidated_balance_sheet": re.compile(r"consolidated\s+balance\s+sheet", re.IGNORECASE),
+    "consolidated_cash_flow": re.compile(r"consolidated\s+(statement\s+of\s+)?cash\s+flows?", re.IGNORECASE),
+}
+
+# Statements each metric is read from; metrics not listed here search the whole report.
+METRIC_SECTIONS = {
+    "revenue_current_year": ["consolidated_profit_loss"],
+    "revenue_previous_year": ["consolidated_profit_loss"],
+    "profit_after_tax_current_year": ["consolidated_profit_loss"],
+    "profit_after_tax_previous_year": ["consolidated_profit_loss"],
+    "total_liabilities": ["consolidated_balance_sheet"],
+    "total_current_assets": ["consolidated_balance_sheet"],
+    "total_current_liabilities": ["consolidated_balance_sheet"],
+    "total_equity": ["consolidated_balance_sheet"],
+    "cash_reserves": ["consolidated_balance_sheet", "consolidated_cash_flow"],
+    "net_cash_from_operations": ["consolidated_cash_flow"],
+}
+
+
+class PageRange(BaseModel):
+    """Defines the start and end page for a document section."""
+    start_page: int = Field(description="The page number where the section begins.")
+    end_page: int = Field(description="The page number where the section ends.")
+
+
+class DocumentMap(BaseModel):
+    """A structured map of key financial statement sections in the report."""
+    consolidated_profit_loss: PageRange
+    consolidated_balance_sheet: PageRange
+    consolidated_cash_flow: PageRange
+
+
+document_navigator_prompt = PromptTemplate(
+    template="""
+        You are an expert document analyst. Your task is to find the STARTING and ENDING page numbers for the key financial statements based on the provided Table of Contents.
+
+        A statement section ends where the next major section begins. Based ONLY on the CONTEXT below, find the page ranges and populate the JSON object according to the schema.
+
+        CONTEXT:
+        {table_of_contents_text}
+    """,
+    input_variables=['table_of_contents_text']
+)
+
+
+def find_toc_text(pages: Sequence[Document], embeddings, text_splitter, k: int = 3) -> str:
+    """Retrieves the table-of-contents text from the first TOC_SCAN_PAGES pages of a report."""
+    chunks = text_splitter.split_documents(list(pages[:TOC_SCAN_PAGES]))
+    if not chunks:
+        return ""
+    toc_store = FAISS.from_documents(documents=chunks, embedding=embeddings)
+    toc = toc_store.as_retriever(search_type='similarity', search_kwargs={'k': k}).invoke("Table of Contents")
+    return "\n\n".join(document.page_content for document in toc)
+
+
+def _page_offset(section: str, printed_start: int, page_text: Callable[[int], str], page_count: int, guesses: Sequence[int]) -> Optional[int]:
+    """
+    PDF index minus printed page number for a section, found by locating its title near the
+    TOC page. Offsets already seen for other sections are tried first, then pages moving
+    outwards from the printed number, so usually only a page or two is read.
+    """
+    title = SECTION_TITLES[section]
+    expected = printed_start - 1
+    candidates = [printed_start + offset for offset in guesses]
+    for distance in range(OFFSET_SEARCH_RADIUS + 1):
+        candidates.extend([expected + distance, expected - distance] if distance else [expected])
+    for index in dict.fromkeys(candidates):
+        if 0 <= index < page_count and title.search(page_text(index)[:500]):
+            return index - printed_start
+    return None
+
+
+def align_sections(document_map: DocumentMap, page_text: Callable[[int], str], page_count: int) -> Dict[str, List[int]]:
+    """
+    Converts the TOC's printed page numbers into 0-based PDF page indices, {section: [first, last]}.
+    Annual reports rarely number the cover and front matter, so the offset is measured from
+    where each statement's title actually appears; sections that make no sense are dropped.
+    """
+    offsets = {}
+    for section, page_range in document_map:
+        if section in SECTION_TITLES:
+            seen = [offset for offset in offsets.values() if offset is not None]
+            offsets[section] = _page_offset(section, page_range.start_page, page_text, page_count, seen)
+    found = [offset for offset in offsets.values() if offset is not None]
+    default_offset = max(set(found), key=found.count) if found else -1
+
+    sections = {}
+    for section, page_range in document_map:
+        offset = offsets.get(section)
+        offset = default_offset if offset is None else offset
+        first, last = page_range.start_page + offset, page_range.end_page + offset
+        if 0 <= first <= last < page_count:
+            sections[section] = [first, last]
+    return sections
+
+
+def map_document(pages: Sequence[Document], page_count: int, mapping_chain, embeddings, text_splitter, page_text: Callable[[int], str] = None) -> dict:
+    """
+    Finds the statement page ranges of a report. pages only needs to hold the first
+    TOC_SCAN_PAGES pages; page_text(index) is used to read the few pages checked while
+    aligning the TOC with the PDF. Returns a JSON-serialisable dict; an unreadable TOC
+    gives empty sections, which means unrestricted retrieval.
+    """
+    toc_text = find_toc_text(pages, embeddings, text_splitter)
+    try:
+        document_map = mapping_chain.invoke({'table_of_contents_text': toc_text}) if toc_text else None
+    except Exception as e:
+        print(f"Could not map the report's statements from its table of contents: {e!r}")
+        document_map = None
+    if document_map is None:
+        return {"document_map": None, "sections": {}}
+    if page_text is None:
+        page_texts = {document.metadata.get('page', index): document.page_content for index, document in enumerate(pages)}
+        page_text = lambda index: page_texts.get(index, "")
+    return {"document_map": document_map.model_dump(), "sections": align_sections(document_map, page_text, page_count)}
+
+
+def save_document_map(index_path: str, mapping: dict):
+    with open(os.path.join(index_path, MAP_FILENAME), 'w') as f:
+        json.dump(mapping, f)
+
+
+def load_document_map(index_path: str) -> Optional[dict]:
+    map_path = os.path.join(index_path, MAP_FILENAME)
+    if not os.path.isfile(map_path):
+        return None
+    with open(map_path) as f:
+        return json.load(f)
+
+
+def pages_to_index(sections: Dict[str, List[int]], page_count: int, margin: int) -> List[int]:
+    """Pages worth embedding for a mapped report: the cover (fiscal year, company name) and every statement with margin pages around it."""
+    pages = set(range(min(COVER_PAGES, page_count))) | pages_for(sections, sections, margin)
+    return sorted(page for page in pages if page < page_count)
+
+
+def pages_for(sections: Dict[str, List[int]], section_names: Iterable[str], margin: int = DEFAULT_PAGE_MARGIN) -> Set[int]:
+    """PDF page indices covered by the named sections, widened by margin pages on each side."""
+    pages = set()
+    for name in section_names:
+        if name in sections:
+            first, last = sections[name]
+            pages.update(range(max(0, first - margin), last + margin + 1))
+    return pages
+
+
+class PageIndex:
+    """
+    The chunks of a FAISS store grouped by page, so a query can score only the rows on the
+    requested pages instead of every chunk in the report.
+    """
+
+    def __init__(self, vector_store: FAISS):
+        self.vector_store = vector_store
+        self.rows_by_page: Dict[int, List[int]] = {}
+        for row, docstore_id in vector_store.index_to_docstore_id.items():
+            page = vector_store.docstore.search(docstore_id).metadata.get('page')
+            if page is not None:
+                self.rows_by_page.setdefault(int(page), []).append(row)
+
+
+_page_indexes = weakref.WeakKeyDictionary()
+_page_indexes_lock = threading.Lock()
+
+
+def page_index_for(vector_store: FAISS) -> PageIndex:
+    """The PageIndex of a loaded store, built on first use and dropped along with the store."""
+    with _page_indexes_lock:
+        page_index = _page_indexes.get(vector_store)
+        if page_index is None:
+            page_index = _page_indexes[vector_store] = PageIndex(vector_store)
+        return page_index
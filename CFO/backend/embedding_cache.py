@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed store of embedding vectors for one embedding model.
+
+    Vectors live in a raw float32 matrix (vectors.f32) that is read through np.memmap;
+    index.sqlite maps each chunk-text hash to its row and tracks when it was last used.
+    When the matrix would grow past max_bytes, the least recently used rows are reused.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9._-]+', '_', model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self.index_path = os.path.join(self.directory, 'index.sqlite')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS entry (key TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entry_last_used ON entry (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+
+    def _dim(self, conn):
+        row = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _rows_for(self, conn, keys) -> Dict[str, int]:
+        rows = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(conn.execute(f"SELECT key, row FROM entry WHERE key IN ({placeholders})", batch).fetchall())
+        return rows
+
+    def _row_count(self, dim: int) -> int:
+        if not dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (dim * 4)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for whichever keys are present."""
+        if not keys:
+            return {}
+        with self._lock:
+            conn = self._connect()
+            try:
+                dim = self._dim(conn)
+                rows = self._rows_for(conn, keys) if dim else {}
+                found = {}
+                if rows:
+                    matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self._row_count(dim), dim))
+                    found = {key: np.array(matrix[row]) for key, row in rows.items()}
+                    now = time.time()
+                    conn.execute("BEGIN")
+                    conn.executemany("UPDATE entry SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                    conn.execute("COMMIT")
+                self.hits += sum(1 for key in keys if key in found)
+                self.misses += sum(1 for key in keys if key not in found)
+                return found
+            finally:
+                conn.close()
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        """Stores new vectors, evicting least recently used rows once the size budget is reached."""
+        if not vectors:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                # BEGIN IMMEDIATE serialises row allocation across worker processes too.
+                conn.execute("BEGIN IMMEDIATE")
+                existing = self._rows_for(conn, list(vectors))
+                new_items = [(key, vector) for key, vector in vectors.items() if key not in existing]
+                if not new_items:
+                    conn.execute("COMMIT")
+                    return
+
+                dim = self._dim(conn)
+                if dim is None:
+                    dim = len(new_items[0][1])
+                    conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (str(dim),))
+                max_rows = max(1, self.max_bytes // (dim * 4))
+                new_items = new_items[:max_rows]
+
+                row_count = self._row_count(dim)
+                appended = min(len(new_items), max(0, max_rows - row_count))
+                slots = list(range(row_count, row_count + appended))
+                needed = len(new_items) - appended
+                if needed:
+                    victims = conn.execute("SELECT key, row FROM entry ORDER BY last_used LIMIT ?", (needed,)).fetchall()
+                    conn.executemany("DELETE FROM entry WHERE key = ?", [(key,) for key, _ in victims])
+                    slots.extend(row for _, row in victims)
+                    self.evictions += len(victims)
+
+                if appended:
+                    with open(self.vectors_path, 'ab') as f:
+                        f.truncate((row_count + appended) * dim * 4)
+                total_rows = row_count + appended
+                matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(total_rows, dim))
+                now = time.time()
+                for (key, vector), row in zip(new_items, slots):
+                    matrix[row] = np.asarray(vector, dtype=np.float32)
+                matrix.flush()
+                del matrix
+                conn.executemany(
+                    "INSERT INTO entry (key, row, last_used) VALUES (?, ?, ?)",
+                    [(key, row, now) for (key, _), row in zip(new_items, slots)],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM entry").fetchone()[0]
+        return {
+            "model": self.model_name,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "bytes_on_disk": os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends chunk texts missing from the EmbeddingCache to the backend."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            fresh = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self.cache.put_many(fresh)
+            cached.update({key: np.asarray(vector, dtype=np.float32) for key, vector in fresh.items()})
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def cached_embeddings(embeddings: Embeddings, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES) -> CachedEmbeddings:
+    """Wraps an embeddings model with a cache stored under cache_dir/<model name>/."""
+    model_name = getattr(embeddings, 'model', None) or type(embeddings).__name__
+    # 'models/text-embedding-004' and 'text-embedding-004' name the same model and share one cache.
+    model_name = model_name.removeprefix('models/')
+    return CachedEmbeddings(embeddings, EmbeddingCache(cache_dir, model_name, max_bytes=max_bytes))
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_MAX_BATCH_SIZE = 100  # texts per batchEmbedContents request accepted by the Gemini API
+DEFAULT_MAX_BATCH_TOKENS = 20000
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+CHARS_PER_TOKEN = 4
+RETRYABLE_MARKERS = ('429', '500', '503', 'quota', 'rate limit', 'resource exhausted', 'resourceexhausted', 'unavailable', 'deadline', 'timeout', 'timed out')
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Quota, rate-limit, timeout and transient server errors are retried; anything else is a real failure."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, 'code', None) in (429, 500, 503) or getattr(error, 'status_code', None) in (429, 500, 503):
+        return True
+    description = f"{type(error).__name__} {error}".lower()
+    return any(marker in description for marker in RETRYABLE_MARKERS)
+
+
+class RateLimiter:
+    """
+    Sliding one-minute budget of requests and tokens. acquire() blocks until a request of
+    the given size fits in both budgets; None means no limit.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None, window: float = 60.0):
+        self.requests_per_minute = requests_per_minute or None
+        self.tokens_per_minute = tokens_per_minute or None
+        self.window = window
+        self._sent = deque()
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+        self.wait_seconds = 0.0
+
+    def _expire(self, now):
+        while self._sent and now - self._sent[0][0] >= self.window:
+            self._tokens_in_window -= self._sent.popleft()[1]
+
+    def acquire(self, tokens: int = 0):
+        if self.tokens_per_minute:
+            # A single request larger than the whole budget could never fit; let it through alone.
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                fits_requests = not self.requests_per_minute or len(self._sent) < self.requests_per_minute
+                fits_tokens = not self.tokens_per_minute or self._tokens_in_window + tokens <= self.tokens_per_minute
+                if fits_requests and fits_tokens:
+                    self._sent.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                delay = max(0.01, self.window - (now - self._sent[0][0]))
+                self.wait_seconds += delay
+            time.sleep(delay)
+
+
+class EmbeddingScheduler(Embeddings):
+    """
+    Embeddings wrapper that sends texts to the backend in the largest batches the API
+    allows, within a requests/tokens-per-minute budget, retrying quota and transient errors
+    with jittered exponential backoff. Keeps throughput counters for stats().
+    """
+
+    def __init__(self, backend: Embeddings, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+                 max_retries: int = DEFAULT_MAX_RETRIES, base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY):
+        self.backend = backend
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats_lock = threading.Lock()
+        self.texts_embedded = 0
+        self.requests = 0
+        self.retries = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def model(self) -> str:
+        """Name of the wrapped model, so caches keyed by model name see through the scheduler."""
+        return getattr(self.backend, 'model', None) or type(self.backend).__name__
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """Groups text positions into batches that fill max_batch_size and max_batch_tokens as far as possible."""
+        batches, current, current_tokens = [], [], 0
+        for position, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(position)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _call(self, fn, tokens: int):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                with self._stats_lock:
+                    self.requests += 1
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                # Full jitter keeps parallel builds from retrying in lockstep.
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"Embedding request failed ({type(e).__name__}: {str(e)[:120]}); retrying in {delay:.1f}s")
+                with self._stats_lock:
+                    self.retries += 1
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in self.pack_batches(texts):
+            batch_texts = [texts[position] for position in batch]
+            started = time.perf_counter()
+            batch_vectors = self._call(lambda: self.backend.embed_documents(batch_texts), sum(map(estimate_tokens, batch_texts)))
+            with self._stats_lock:
+                self.busy_seconds += time.perf_counter() - started
+                self.texts_embedded += len(batch_texts)
+            for position, vector in zip(batch, batch_vectors):
+                vectors[position] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(lambda: self.backend.embed_query(text), estimate_tokens(text))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "model": self.model,
+                "texts_embedded": self.texts_embedded,
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limit_wait_seconds": round(self.limiter.wait_seconds, 2),
+                "chunks_per_second": round(self.texts_embedded / self.busy_seconds, 2) if self.busy_seconds else None,
+            }
+
+
+def _key(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCheckpoint:
+    """
+    Vectors embedded so far by one index build, kept in a small SQLite file so a build that
+    dies part way (quota, crash, restart) resumes where it stopped. Removed once the build
+    has saved its index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS vector (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        keys = {_key(text): text for text in texts}
+        found = {}
+        with self._connect() as conn:
+            key_list = list(keys)
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                rows = conn.execute(f"SELECT key, vector FROM vector WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+                found.update((keys[key], np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vector (key, vector) VALUES (?, ?)",
+                [(_key(text), np.asarray(vector, dtype=np.float32).tobytes()) for text, vector in vectors.items()]
+            )
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM vector").fetchone()[0]
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
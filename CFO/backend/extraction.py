@@ -0,0 +1,150 @@
+import threading
+import time
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+DEFAULT_MAX_CONCURRENCY = 6
+DEFAULT_CALL_TIMEOUT = 45.0
+
+
+class MetricTimeoutError(TimeoutError):
+    """Raised (recorded) when a single metric extraction exceeds its time budget."""
+
+
+class ConcurrencyBudget:
+    """
+    Process-wide cap on LLM calls in flight, shared by every analysis running at once, so
+    a batch of reports analyzed in parallel stays within the model's rate limits however
+    many documents are open. Use as a context manager around each call.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._slots = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Waits for a slot (at most timeout seconds, if given); False when none came free in time."""
+        with self._lock:
+            self.waiting += 1
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            self.waiting -= 1
+            self.wait_seconds += time.monotonic() - started
+            if acquired:
+                self.in_flight += 1
+                self.calls += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "calls": self.calls,
+                "wait_seconds": round(self.wait_seconds, 2),
+            }
+
+
+def run_metric_tasks(
+    tasks: Dict[str, Callable[[], Any]],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout: float = DEFAULT_CALL_TIMEOUT,
+    on_complete: Optional[Callable[[str, Any, Optional[BaseException]], None]] = None,
+    budget: Optional[ConcurrencyBudget] = None,
+) -> Tuple[Dict[str, Any], Dict[str, BaseException]]:
+    """
+    Runs one callable per metric on a bounded thread pool and gathers the results.
+
+    The timeout is measured from the moment a task gets a thread, so metrics queued behind
+    max_concurrency are not penalised. A task that fails or runs past its budget is reported
+    in the errors dict and never blocks the remaining metrics. on_complete, if given, is
+    called as (key, value, error) as soon as each metric settles. With a budget, each task
+    also waits for one of its slots before it starts; that wait counts against its timeout,
+    so calls stuck elsewhere in the process cannot stall it past its deadline.
+    """
+    results: Dict[str, Any] = {}
+    errors: Dict[str, BaseException] = {}
+    if not tasks:
+        return results, errors
+
+    started: Dict[str, float] = {}
+
+    def _run(key, fn):
+        started[key] = time.monotonic()
+        if budget is None:
+            return fn()
+        if not budget.acquire(timeout=timeout):
+            raise MetricTimeoutError(f"'{key}' got no LLM slot within {timeout:g}s")
+        try:
+            return fn()
+        finally:
+            budget.release()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="metric")
+    try:
+        # Each task runs in a copy of the caller's context so context-local settings
+        # (e.g. an LLM cache bypass) apply inside the worker threads too.
+        futures = {executor.submit(copy_context().run, _run, key, fn): key for key, fn in tasks.items()}
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            wait_for = max(0.0, min(deadlines) - now) if deadlines else timeout
+            done, pending = wait(pending, timeout=min(wait_for, timeout) or 0.01, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as exc:
+                    errors[key] = exc
+                if on_complete:
+                    on_complete(key, results.get(key), errors.get(key))
+
+            now = time.monotonic()
+            for future in list(pending):
+                key = futures[future]
+                if key in started and now - started[key] >= timeout:
+                    future.cancel()
+                    errors[key] = MetricTimeoutError(f"'{key}' did not finish within {timeout:g}s")
+                    pending.discard(future)
+                    if on_complete:
+                        on_complete(key, None, errors[key])
+    finally:
+        # Do not wait for timed-out calls; their threads finish in the background.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results, errors
+
+
+def unique_documents(documents):
+    """Drops repeated chunks (same text) while keeping the first-seen order."""
+    seen = set()
+    unique = []
+    for doc in documents:
+        if doc.page_content in seen:
+            continue
+        seen.add(doc.page_content)
+        unique.append(doc)
+    return unique
@@ -0,0 +1,164 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Report fields holding a figure of the report's own fiscal year, and the fact each one is stored as.
+CURRENT_YEAR_FIELDS = {
+    "revenue_current_year": "revenue",
+    "profit_after_tax_current_year": "profit_after_tax",
+    "total_liabilities": "total_liabilities",
+    "cash_reserves": "cash_reserves",
+    "net_cash_from_operations": "net_cash_from_operations",
+    "total_current_assets": "total_current_assets",
+    "total_current_liabilities": "total_current_liabilities",
+    "total_equity": "total_equity",
+}
+# Comparative (previous-year) fields: the fact they hold and the current-year field printed next to them.
+PREVIOUS_YEAR_FIELDS = {
+    "revenue_previous_year": ("revenue", "revenue_current_year"),
+    "profit_after_tax_previous_year": ("profit_after_tax", "profit_after_tax_current_year"),
+}
+# A year's own report is the authority on its figures; the next report's comparative column
+# only fills in years whose report was never analyzed.
+REPORTED = 'reported'
+COMPARATIVE = 'comparative'
+# Crores per unit for the units reports are printed in (crore, lakh, thousand, rupees).
+UNIT_SCALES = (1.0, 0.01, 0.00001, 0.0000001)
+# Figures agree when they differ by no more than rounding: half of the printed unit, or 0.1% of the
+# stored figure, which may itself have been rounded to a coarser unit.
+RELATIVE_TOLERANCE = 0.001
+# Stored figures below this (in crores), zero included, are never confirmed; they are extracted.
+MIN_CONFIRMABLE = 0.01
+# A unit is only tried when the figure would be printed as at least one of it.
+MIN_PRINTED = 1.0
+
+_COMPANY_SUFFIXES = {"limited", "ltd", "inc", "incorporated", "plc", "corp", "corporation", "co", "company", "pvt", "private", "llc"}
+_FIGURE = re.compile(r"\(?-?\d[\d,]*(?:\.\d+)?\)?")
+# Numbers right after these words are references (notes, pages, years), not amounts.
+_REFERENCE_WORDS = re.compile(r"\b(?:note|notes|page|pages|fy|no\.?|schedule)\s*$", re.IGNORECASE)
+
+
+def company_key(name) -> Optional[str]:
+    """'Acme Industries Ltd.' and 'ACME INDUSTRIES LIMITED' share a key; None when there is no name."""
+    words = re.findall(r"[a-z0-9]+", str(name or "").lower())
+    while words and words[-1] in _COMPANY_SUFFIXES:
+        words.pop()
+    key = " ".join(words)
+    return key if key and key != "none" else None
+
+
+def company_from_filename(filename: str) -> str:
+    """
+    A company name from a report's file name, without the year and report words that differ
+    between a company's reports: 'acme_2023.pdf' and 'Acme FY24 Annual Report.pdf' both give
+    an 'acme' key, so their figures form one history. Falls back to the bare file name.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    words = [
+        word for word in re.split(r"[\s_.\-]+", stem)
+        if word and not re.fullmatch(r"(?i)(?:fy'?)?\d{2,4}|annual|report|reports|ar|consolidated|standalone", word)
+    ]
+    return " ".join(words) or stem
+
+
+def fiscal_year_end(text) -> Optional[int]:
+    """The calendar year a fiscal year ends in: 'FY24', 'FY 2023-24', '2023-2024' and '2024' all give 2024."""
+    text = str(text or "")
+    span = re.search(r"(?<!\d)((?:19|20)\d{2})\s*[-–/]\s*(\d{4}|\d{2})(?!\d)", text)
+    if span:
+        start, end = int(span.group(1)), int(span.group(2))
+        if end < 100:
+            end += start - start % 100
+            if end < start:
+                end += 100
+        return end
+    short = re.search(r"FY\s*'?(\d{4}|\d{2})(?!\d)", text, re.IGNORECASE)
+    if short:
+        year = int(short.group(1))
+        return year if year >= 100 else 2000 + year
+    year = re.search(r"(?<!\d)((?:19|20)\d{2})(?!\d)", text)
+    return int(year.group(1)) if year else None
+
+
+def report_facts(extracted: dict, failed_metrics: Iterable[str] = ()) -> List[Tuple[int, str, float, str]]:
+    """
+    (fiscal_year, fact, value, source) for every figure an analysis extracted: its current-year
+    figures as reported, its previous-year figures as comparatives. Failed metrics are skipped,
+    and so is everything when the fiscal year itself is unknown.
+    """
+    failed = set(failed_metrics)
+    fiscal_year = fiscal_year_end(extracted.get("fiscal_year"))
+    if fiscal_year is None or "fiscal_year" in failed:
+        return []
+    facts = []
+    for field, fact in CURRENT_YEAR_FIELDS.items():
+        if field not in failed and extracted.get(field) is not None:
+            facts.append((fiscal_year, fact, float(extracted[field]), REPORTED))
+    for field, (fact, _) in PREVIOUS_YEAR_FIELDS.items():
+        if field not in failed and extracted.get(field) is not None:
+            facts.append((fiscal_year - 1, fact, float(extracted[field]), COMPARATIVE))
+    return facts
+
+
+def figures_in(text: str) -> List[float]:
+    """
+    The amounts printed in text, '(980)' read as -980 and thousands separators dropped. Numbers
+    that look like references are skipped: years, bare integers under 100 (page and note numbers),
+    the second half of ranges such as 2023-24, and numbers after 'Note', 'Page', 'FY' and the like.
+    """
+    text = text or ""
+    figures = []
+    for match in _FIGURE.finditer(text):
+        token = match.group()
+        start = match.start()
+        if start and text[start - 1].isdigit() or _REFERENCE_WORDS.search(text[max(0, start - 12):start]):
+            continue
+        if token.isdigit() and (int(token) < 100 or 1900 <= int(token) <= 2099):
+            continue
+        negative = token.startswith("(") and token.endswith(")")
+        try:
+            value = float(token.strip("()").replace(",", ""))
+        except ValueError:
+            continue
+        figures.append(-value if negative else value)
+    return figures
+
+
+def appears_in(value: float, text: str) -> bool:
+    """
+    Whether a figure in crores is printed in text, in a unit its size makes plausible and within
+    rounding (sign conventions vary, so only magnitudes are compared). Zero and near-zero figures
+    are never confirmed: they would match almost any text.
+    """
+    target = abs(value)
+    if target < MIN_CONFIRMABLE:
+        return False
+    scales = [scale for scale in UNIT_SCALES if target / scale >= MIN_PRINTED]
+    for figure in figures_in(text):
+        for scale in scales:
+            if abs(abs(figure) * scale - target) <= max(0.5 * scale, RELATIVE_TOLERANCE * target):
+                return True
+    return False
+
+
+def reuse_previous_year(answers: dict, history: Dict[int, Dict[str, float]], contexts: Dict[str, str], fields: Iterable[str] = PREVIOUS_YEAR_FIELDS) -> Dict[str, dict]:
+    """
+    Fills previous-year fields of answers from the facts stored for the fiscal year before the
+    report's. Instead of a fresh extraction, each stored figure is cross-checked against the text
+    its current-year counterpart was read from, where the comparative column is printed beside it.
+    Only confirmed figures are filled; the rest are left for extraction (a restatement, another
+    company under the same name, or a missing fact). Returns {field: check} for every field looked up.
+    """
+    fiscal_year = fiscal_year_end(answers.get("fiscal_year"))
+    previous = history.get(fiscal_year - 1, {}) if fiscal_year is not None else {}
+    checks = {}
+    for field in fields:
+        fact, current_field = PREVIOUS_YEAR_FIELDS[field]
+        if fact not in previous:
+            continue
+        confirmed = appears_in(previous[fact], contexts.get(current_field, ""))
+        checks[field] = {"fiscal_year": fiscal_year - 1, "stored": previous[fact], "confirmed": confirmed}
+        if confirmed:
+            answers[field] = previous[fact]
+    return checks
@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import re
+import sys
+import threading
+import weakref
+from collections import Counter
+from typing import Dict, List, Optional, Set
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+from document_map import METRIC_SECTIONS, DEFAULT_PAGE_MARGIN, page_index_for, pages_for
+from telemetry import span
+from vector_store_cache import index_size_bytes
+
+
+BM25_FILENAME = 'bm25.json'
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+RERANK_CANDIDATES = 20
+LABEL_WEIGHT = 0.5
+NUMBER_WEIGHT = 0.3
+# How far after a line-item label its figures are expected to appear.
+NUMBER_WINDOW_CHARS = 120
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+NUMBER_PATTERN = re.compile(r"\d")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "the", "this", "to", "was", "what", "which", "with", "value", "year", "current", "previous",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower().replace(",", "")) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of one FAISS index, with rows numbered as in the FAISS
+    index so both retrievers score the same candidates. Built once at ingestion and saved
+    as bm25.json next to index.faiss; postings are held as (row, frequency) arrays.
+    """
+
+    def __init__(self, doc_lengths: List[int], postings: Dict[str, List[List[int]]]):
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.postings = {term: np.asarray(posting, dtype=np.int32).reshape(-1, 2) for term, posting in postings.items()}
+        self.row_count = len(doc_lengths)
+        self.avg_length = float(self.doc_lengths.mean()) if self.row_count else 0.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str]) -> 'BM25Index':
+        doc_lengths, postings = [], {}
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                postings.setdefault(term, []).append([row, frequency])
+        return cls(doc_lengths, postings)
+
+    @classmethod
+    def from_vector_store(cls, vector_store: FAISS) -> 'BM25Index':
+        ids = vector_store.index_to_docstore_id
+        return cls.from_texts([vector_store.docstore.search(ids[row]).page_content for row in range(len(ids))])
+
+    def save(self, index_path: str):
+        with open(os.path.join(index_path, BM25_FILENAME), 'w') as f:
+            json.dump({
+                "doc_lengths": self.doc_lengths.astype(int).tolist(),
+                "postings": {term: posting.tolist() for term, posting in self.postings.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, index_path: str) -> Optional['BM25Index']:
+        path = os.path.join(index_path, BM25_FILENAME)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["doc_lengths"], data["postings"])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index: its arrays plus the term dictionary."""
+        return (self.doc_lengths.nbytes + sys.getsizeof(self.postings)
+                + sum(sys.getsizeof(term) + sys.getsizeof(posting) for term, posting in self.postings.items()))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for the query."""
+        scores = np.zeros(self.row_count, dtype=np.float32)
+        if not self.row_count:
+            return scores
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None or not len(posting):
+                continue
+            rows, frequencies = posting.T
+            idf = math.log(1 + (self.row_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            lengths = self.doc_lengths[rows]
+            frequencies = frequencies.astype(np.float32)
+            scores[rows] += idf * frequencies * (BM25_K1 + 1) / (frequencies + BM25_K1 * (1 - BM25_B + BM25_B * lengths / self.avg_length))
+        return scores
+
+
+def _normalize(text: str) -> str:
+    """Same character rules as table_parser.normalize_label, so labels built by build_synonyms match."""
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9/]+", " ", text.lower())).strip()
+
+
+def rerank_score(text: str, labels: List[str]) -> float:
+    """
+    Cheap local relevance for a line-item lookup: LABEL_WEIGHT if a target label appears
+    verbatim (partial credit for word overlap), plus NUMBER_WEIGHT if figures follow it.
+    """
+    if not labels:
+        return 0.0
+    normalized = _normalize(text)
+    words = set(tokenize(normalized))
+    label_score, number_score = 0.0, 0.0
+    for label in labels:
+        position = normalized.find(label)
+        if position >= 0:
+            label_score = 1.0
+            after = normalized[position + len(label):position + len(label) + NUMBER_WINDOW_CHARS]
+            if NUMBER_PATTERN.search(after):
+                number_score = 1.0
+                break
+        else:
+            label_words = set(tokenize(label))
+            if label_words:
+                label_score = max(label_score, 0.5 * len(label_words & words) / len(label_words))
+    if not number_score and NUMBER_PATTERN.search(normalized):
+        number_score = 0.3
+    return LABEL_WEIGHT * label_score + NUMBER_WEIGHT * number_score
+
+
+class HybridIndex:
+    """Dense (FAISS vectors) and sparse (BM25) scoring over the same rows, fused and reranked."""
+
+    def __init__(self, vector_store: FAISS, bm25: BM25Index):
+        self.vector_store = vector_store
+        self.bm25 = bm25
+        self.page_index = page_index_for(vector_store)
+
+    def candidate_rows(self, pages: Set[int]) -> np.ndarray:
+        if pages:
+            rows = sorted(row for page in pages for row in self.page_index.rows_by_page.get(page, []))
+            if rows:
+                return np.asarray(rows, dtype=np.int64)
+        return np.arange(self.vector_store.index.ntotal, dtype=np.int64)
+
+    def search(self, query: str, labels: List[str], pages: Set[int], k: int) -> List[Document]:
+        rows = self.candidate_rows(pages)
+        with span("embed_query"):
+            query_vector = np.asarray(self.vector_store.embedding_function.embed_query(query), dtype=np.float32)
+        with span("faiss_search", candidates=len(rows)):
+            return self._rank(query, query_vector, rows, labels, k)
+
+    def _rank(self, query: str, query_vector: np.ndarray, rows: np.ndarray, labels: List[str], k: int) -> List[Document]:
+        # Only the candidate rows' vectors are read back from FAISS; the store keeps no second copy.
+        distances = np.sum((self.vector_store.index.reconstruct_batch(rows) - query_vector) ** 2, axis=1)
+        sparse = self.bm25.scores(" ".join([query] + labels))[rows]
+
+        # Reciprocal rank fusion: robust to the two scores living on different scales.
+        # Rows sharing no term with the query get no BM25 rank at all.
+        dense_order = np.argsort(distances)
+        sparse_order = np.argsort(-sparse)[:int(np.count_nonzero(sparse))]
+        fused = np.zeros(len(rows), dtype=np.float32)
+        fused[dense_order] += 1.0 / (RRF_K + np.arange(1, len(dense_order) + 1))
+        fused[sparse_order] += 1.0 / (RRF_K + np.arange(1, len(sparse_order) + 1))
+        fused /= fused.max() if len(fused) else 1.0
+
+        # The best of each ranker is always reranked, so a strong hit from one is not
+        # crowded out of the shortlist by rows that are merely middling in both.
+        depth = max(k, RERANK_CANDIDATES)
+        shortlist = list(dict.fromkeys(np.concatenate([np.argsort(-fused)[:depth], dense_order[:depth], sparse_order[:depth]]).tolist()))
+        documents = [self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[int(rows[i])]) for i in shortlist]
+        scored = [(fused[i] + rerank_score(document.page_content, labels), document) for i, document in zip(shortlist, documents)]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [document for _, document in scored[:k]]
+
+
+_hybrid_indexes = weakref.WeakKeyDictionary()
+_hybrid_indexes_lock = threading.Lock()
+
+
+def hybrid_index_for(vector_store: FAISS, index_path: str) -> HybridIndex:
+    """The HybridIndex of a loaded store; indexes built before BM25 was saved get one built from the docstore."""
+    with _hybrid_indexes_lock:
+        hybrid = _hybrid_indexes.get(vector_store)
+        if hybrid is None:
+            bm25 = BM25Index.load(index_path) or BM25Index.from_vector_store(vector_store)
+            hybrid = _hybrid_indexes[vector_store] = HybridIndex(vector_store, bm25)
+        return hybrid
+
+
+def loaded_size_bytes(index_path: str, vector_store: FAISS) -> int:
+    """
+    What a loaded store occupies together with its hybrid index: the saved FAISS index and
+    docstore, plus BM25 as held in memory (which bm25.json on disk understates).
+    """
+    return index_size_bytes(index_path, exclude={BM25_FILENAME}) + hybrid_index_for(vector_store, index_path).bm25.nbytes
+
+
+def metric_retriever(vector_store: FAISS, index_path: str, sections: Dict[str, List[int]], metric: str, labels: List[str],
+                     k: int = 3, margin: int = DEFAULT_PAGE_MARGIN):
+    """Hybrid retriever for one metric, limited to its statement's pages when the document map has them."""
+    pages = pages_for(sections, METRIC_SECTIONS.get(metric, []), margin)
+    hybrid = hybrid_index_for(vector_store, index_path)
+    return RunnableLambda(lambda query: hybrid.search(query, labels, pages, k))
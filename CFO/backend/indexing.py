@@ -0,0 +1,174 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from itertools import islice
+from typing import Iterable
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from embedding_scheduler import EmbeddingCheckpoint
+from hybrid_retrieval import BM25Index
+from document_map import TOC_SCAN_PAGES, load_document_map, pages_to_index, save_document_map
+from pdf_pages import DEFAULT_EXTRACT_WORKERS, DEFAULT_PAGE_BATCH, PdfPages
+from telemetry import span
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+DEFAULT_EMBED_BATCH = 200
+
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def file_sha256(file_path: str) -> str:
+    """Hex SHA-256 of a file's contents, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_path_for(document_hash: str, index_root: str) -> str:
+    return os.path.join(index_root, document_hash)
+
+
+def index_exists(index_path: str) -> bool:
+    return os.path.isfile(os.path.join(index_path, 'index.faiss')) and os.path.isfile(os.path.join(index_path, 'index.pkl'))
+
+
+def _lock_for(document_hash: str) -> threading.Lock:
+    with _build_locks_guard:
+        return _build_locks.setdefault(document_hash, threading.Lock())
+
+
+def _map_pdf(pages: PdfPages, mapper) -> dict:
+    with span("document_map"):
+        return mapper(pages.documents(range(TOC_SCAN_PAGES)), pages.page_count, pages.text)
+
+
+def split_pages(documents: Iterable[Document], text_splitter) -> Iterable[Document]:
+    """Chunks pages one at a time as they arrive; chunks keep their page's metadata."""
+    for document in documents:
+        with span("split"):
+            chunks = text_splitter.split_documents([document])
+        yield from chunks
+
+
+def embed_chunks(chunks: Iterable[Document], embedding_model, batch_size: int = DEFAULT_EMBED_BATCH, checkpoint: EmbeddingCheckpoint = None):
+    """
+    Builds a FAISS store from a stream of chunks, embedding batch_size chunks at a time.
+    With a checkpoint, every embedded batch is saved before the next one starts and
+    chunks already in it are not sent again. Returns (store, chunk_count).
+    """
+    chunks = iter(chunks)
+    vector_store, count, resumed = None, 0, 0
+    while True:
+        batch = list(islice(chunks, batch_size))
+        if not batch:
+            break
+        texts = [chunk.page_content for chunk in batch]
+        done = checkpoint.get_many(texts) if checkpoint else {}
+        missing = list(dict.fromkeys(text for text in texts if text not in done))
+        if missing:
+            with span("embed", texts=len(missing)):
+                fresh = dict(zip(missing, embedding_model.embed_documents(missing)))
+            if checkpoint:
+                checkpoint.put_many(fresh)
+            done.update(fresh)
+        resumed += len(texts) - len(missing)
+        text_embeddings = [(text, done[text]) for text in texts]
+        metadatas = [chunk.metadata for chunk in batch]
+        with span("faiss_add", chunks=len(batch)):
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas)
+            else:
+                vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+        count += len(batch)
+    if resumed:
+        print(f"Resumed from checkpoint: {resumed} chunks were already embedded.")
+    return vector_store, count
+
+
+def build_index(pdf_path: str, index_path: str, embedding_model, text_splitter, mapper=None, statement_margin=None,
+                extract_workers: int = DEFAULT_EXTRACT_WORKERS, page_batch: int = DEFAULT_PAGE_BATCH, embed_batch: int = DEFAULT_EMBED_BATCH) -> int:
+    """
+    Chunks and embeds a PDF, then saves the FAISS index. Chunks keep 0-based 'page' metadata.
+    Returns the chunk count.
+
+    With a mapper, ingestion has two stages: mapper(first_pages, page_count, page_text) reads
+    the table of contents from the first pages and returns the document map, which is saved
+    with the index. If statement_margin is also set, only the mapped statement pages (plus
+    that many pages either side, and the cover) are extracted and embedded; reports whose
+    TOC cannot be mapped are indexed in full.
+
+    Pages are extracted in batches across extract_workers processes and streamed through
+    the splitter into the embedder, so the whole report is never held in memory as pages.
+    """
+    with span("pdf_load"):
+        pages = PdfPages(pdf_path)
+    mapping = _map_pdf(pages, mapper) if mapper is not None else None
+    if mapping and mapping.get('sections') and statement_margin is not None:
+        selected = pages_to_index(mapping['sections'], pages.page_count, statement_margin)
+    else:
+        selected = list(range(pages.page_count))
+    if mapping is not None:
+        mapping['indexed_pages'] = 'all' if len(selected) == pages.page_count else selected
+
+    print(f"Embedding {len(selected)} of {pages.page_count} pages of {os.path.basename(pdf_path)}...")
+    # Lives next to the index, so an interrupted build of the same document picks it up again.
+    os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+    checkpoint = EmbeddingCheckpoint(index_path.rstrip(os.sep) + '.checkpoint.sqlite')
+    started = time.perf_counter()
+    documents = pages.iter_documents(selected, max_workers=extract_workers, batch_size=page_batch)
+    vector_store, chunk_count = embed_chunks(split_pages(documents, text_splitter), embedding_model, embed_batch, checkpoint)
+    if vector_store is None:
+        raise ValueError(f"No text could be extracted from {os.path.basename(pdf_path)}.")
+    elapsed = time.perf_counter() - started
+    print(f"Embedded {chunk_count} chunks ({pages.pages_read} pages parsed) in {elapsed:.1f}s, {chunk_count / elapsed:.1f} chunks/s.")
+    cache = getattr(embedding_model, 'cache', None)
+    if cache is not None:
+        print(f"Embedding cache: {cache.stats()}")
+
+    # Save next to the final location and swap it in, so readers never see a half-written index.
+    tmp_path = tempfile.mkdtemp(prefix='.building-', dir=os.path.dirname(index_path))
+    try:
+        with span("index_save", chunks=chunk_count):
+            vector_store.save_local(tmp_path)
+            BM25Index.from_vector_store(vector_store).save(tmp_path)
+            if mapper is not None:
+                save_document_map(tmp_path, mapping)
+        if os.path.isdir(index_path):
+            shutil.rmtree(index_path)
+        os.replace(tmp_path, index_path)
+        checkpoint.remove()
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return chunk_count
+
+
+def ensure_document_index(pdf_path: str, embedding_model, text_splitter, index_root: str, document_hash: str = None, mapper=None, **build_options):
+    """
+    Returns (document_hash, index_path) for a PDF, building the index only if no index
+    exists yet for this exact file content. Re-uploads and other users' uploads of the
+    same report reuse the stored index (and document map) without any model calls.
+    build_options are passed on to build_index.
+    """
+    document_hash = document_hash or file_sha256(pdf_path)
+    index_path = index_path_for(document_hash, index_root)
+    if index_exists(index_path) and (mapper is None or load_document_map(index_path) is not None):
+        return document_hash, index_path
+
+    with _lock_for(document_hash):
+        if not index_exists(index_path):
+            with span("index_build") as build:
+                build.set(chunks=build_index(pdf_path, index_path, embedding_model, text_splitter, mapper, **build_options))
+            print(f"Saved FAISS index for document {document_hash[:12]} to {index_path}")
+        elif mapper is not None and load_document_map(index_path) is None:
+            # Indexes built before document maps existed get theirs added once.
+            mapping = _map_pdf(PdfPages(pdf_path), mapper)
+            mapping['indexed_pages'] = 'all'
+            save_document_map(index_path, mapping)
+    return document_hash, index_path
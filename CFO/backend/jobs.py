@@ -0,0 +1,126 @@
+import json
+import sqlite3
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import telemetry
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = {SUCCEEDED, FAILED}
+
+
+class JobStore:
+    """SQLite-backed record of every background job, its progress events and its result."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    user_id INTEGER,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    progress TEXT NOT NULL DEFAULT '[]',
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_job_user_created ON job (user_id, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind: str, user_id=None, payload=None) -> str:
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO job (id, kind, user_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, user_id, QUEUED, json.dumps(payload or {}), now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        for key in ('payload', 'result'):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        fields['updated_at'] = datetime.utcnow().isoformat()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE job SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def add_progress(self, job_id: str, event: dict):
+        event = dict(event, at=datetime.utcnow().isoformat())
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT progress FROM job WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            progress = json.loads(row['progress'])
+            progress.append(event)
+            conn.execute(
+                "UPDATE job SET progress = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(progress), event['at'], job_id),
+            )
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+        job['progress'] = json.loads(job['progress'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def fail_unfinished(self, reason: str) -> int:
+        """Marks jobs left queued/running by a previous process as failed."""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE job SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?)",
+                (FAILED, reason, datetime.utcnow().isoformat(), QUEUED, RUNNING),
+            )
+            return cursor.rowcount
+
+
+class JobRunner:
+    """Runs jobs on a local thread pool and records their lifecycle in a JobStore."""
+
+    def __init__(self, store: JobStore, max_workers: int = 2):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+
+    def submit(self, kind: str, fn, user_id=None, payload=None) -> str:
+        """
+        Queues fn(report_progress) and returns the job id immediately. fn's return value
+        (JSON-serialisable) becomes the job result; report_progress(event_dict) appends
+        a progress event that status polls can show.
+        """
+        job_id = self.store.create(kind, user_id=user_id, payload=payload)
+        self.executor.submit(self._run, job_id, kind, user_id, fn)
+        return job_id
+
+    def _run(self, job_id: str, kind: str, user_id, fn):
+        self.store.update(job_id, status=RUNNING)
+        try:
+            # The job's spans are kept as a trace under its id (see telemetry.py).
+            with telemetry.trace(kind, trace_id=job_id, user_id=user_id):
+                result = fn(lambda event: self.store.add_progress(job_id, event))
+        except Exception as exc:
+            traceback.print_exc()
+            self.store.update(job_id, status=FAILED, error=f"{type(exc).__name__}: {exc}")
+        else:
+            self.store.update(job_id, status=SUCCEEDED, result=result)
@@ -0,0 +1,137 @@
+from typing import Dict, Iterable, List, Mapping
+import numpy as np
+import pandas as pd
+
+
+KEY_COLUMNS = ["company_name", "fiscal_year"]
+FIGURE_COLUMNS = [
+    "revenue_current_year", "revenue_previous_year",
+    "profit_after_tax_current_year", "profit_after_tax_previous_year",
+    "total_liabilities", "cash_reserves", "net_cash_from_operations",
+    "total_current_assets", "total_current_liabilities", "total_equity",
+]
+KPI_COLUMNS = [
+    "revenue_growth_percent", "profit_margin_percent", "monthly_net_cash_flow", "monthly_burn_rate",
+    "runway_months", "current_ratio", "debt_to_equity_ratio", "return_on_equity_percent",
+]
+# What the dashboard and the narrative prompt have always been sent for a company that is not burning cash.
+INFINITE_RUNWAY = "Infinity"
+
+
+def figures_frame(records: Iterable[Mapping]) -> pd.DataFrame:
+    """
+    Columnar table of extracted figures, one row per company and fiscal year. Missing or
+    non-numeric figures become NaN, so one bad value only blanks the KPIs that use it.
+    """
+    frame = pd.DataFrame.from_records(list(records))
+    for column in KEY_COLUMNS:
+        if column not in frame:
+            frame[column] = None
+    for column in FIGURE_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce') if column in frame else np.nan
+    return frame
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _figure(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(values), values, np.nan)
+
+
+def _round(values: np.ndarray) -> np.ndarray:
+    """
+    Two decimals exactly as Python's round() gives them. np.round scales by 100 and rounds
+    half to even, which can land a cent away for values such as -0.005 or 1.005; those
+    near-half values are rounded one by one, the rest stay vectorized.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, 2)
+    with np.errstate(invalid='ignore'):
+        scaled = values * 100
+        near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    rounded[near_half] = [round(float(value), 2) for value in values[near_half]]
+    return rounded
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray, defined: np.ndarray) -> np.ndarray:
+    """numerator / denominator where defined holds, NaN elsewhere."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(defined, numerator / denominator, np.nan)
+
+
+def kpi_arrays(figures: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Every KPI for every row of figure columns in one pass of array arithmetic.
+    Undefined KPIs (no previous revenue, zero equity, an unknown input) are NaN; a
+    company that is not burning cash has a runway of +inf. Same rules and rounding as the
+    dashboard has always used: two decimals, with runway measured against the rounded burn.
+    """
+    revenue = _figure(figures["revenue_current_year"])
+    previous_revenue = _figure(figures["revenue_previous_year"])
+    profit = _figure(figures["profit_after_tax_current_year"])
+    cash = _figure(figures["cash_reserves"])
+    operating_cash = _figure(figures["net_cash_from_operations"])
+    current_assets = _figure(figures["total_current_assets"])
+    current_liabilities = _figure(figures["total_current_liabilities"])
+    liabilities = _figure(figures["total_liabilities"])
+    equity = _figure(figures["total_equity"])
+    has_equity = np.isfinite(equity) & (equity != 0)
+
+    monthly_cash_flow = _round(operating_cash / 12)
+    burn = np.where(monthly_cash_flow < 0, -monthly_cash_flow, np.where(np.isnan(monthly_cash_flow), np.nan, 0.0))
+    # A burn that rounds to zero shows as 0 on the dashboard, so its runway is infinite too.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        runway = np.where(burn > 0, cash / burn, np.where(np.isnan(burn), np.nan, np.inf))
+
+    kpis = {
+        "revenue_growth_percent": _ratio(revenue - previous_revenue, previous_revenue, previous_revenue > 0) * 100,
+        "profit_margin_percent": _ratio(profit, revenue, revenue > 0) * 100,
+        "monthly_net_cash_flow": monthly_cash_flow,
+        "monthly_burn_rate": burn,
+        "runway_months": runway,
+        "current_ratio": _ratio(current_assets, current_liabilities, current_liabilities > 0),
+        "debt_to_equity_ratio": _ratio(liabilities, equity, has_equity),
+        "return_on_equity_percent": _ratio(profit, equity, has_equity) * 100,
+    }
+    return {column: _round(values) for column, values in kpis.items()}
+
+
+def compute_kpis(frame: pd.DataFrame) -> pd.DataFrame:
+    """KPI table for a figures table (see figures_frame), indexed like the input."""
+    figures = {column: frame[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in FIGURE_COLUMNS}
+    return pd.DataFrame(kpi_arrays(figures), index=frame.index)
+
+
+def _json_values(column: str, values: np.ndarray) -> list:
+    values = np.asarray(values, dtype=np.float64)
+    cleaned = np.where(np.isfinite(values), values, None)
+    if column == "runway_months":
+        cleaned[values == np.inf] = INFINITE_RUNWAY
+    return cleaned.tolist()
+
+
+def kpi_records(table: pd.DataFrame) -> List[dict]:
+    """
+    Rows of a KPI table as JSON-ready dicts: NaN and other non-finite KPIs become None,
+    except an infinite runway, which is reported as INFINITE_RUNWAY. Non-KPI columns
+    (company, year, document) are passed through with missing values as None.
+    """
+    columns = list(table.columns)
+    values = [
+        _json_values(column, table[column].to_numpy(dtype=np.float64, na_value=np.nan)) if column in KPI_COLUMNS
+        else table[column].astype(object).where(table[column].notna(), None).tolist()
+        for column in columns
+    ]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def report_kpis(figures: Mapping) -> dict:
+    """KPIs of a single report, as the dashboard, narrative and risk prompts expect them."""
+    kpis = kpi_arrays({column: [_as_float(figures.get(column))] for column in FIGURE_COLUMNS})
+    return {column: _json_values(column, kpis[column])[0] for column in KPI_COLUMNS}
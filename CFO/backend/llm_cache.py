@@ -0,0 +1,118 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 20000
+
+_bypass = ContextVar('llm_cache_bypass', default=False)
+
+# langchain_core.load.loads is marked beta and warns on first use; it is what LangChain's own caches use.
+warnings.filterwarnings('ignore', message='The function `loads` is in beta')
+
+
+@contextmanager
+def bypass_llm_cache():
+    """Forces fresh model calls inside the block; their responses still refresh the cache."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+class PersistentLLMCache(BaseCache):
+    """
+    SQLite-backed LangChain LLM cache with TTL and LRU size eviction.
+
+    LangChain passes the fully rendered prompt (template + inputs) and an llm_string that
+    describes the model, its parameters and any bound tools, so structured-output schemas
+    are part of the key as well.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_response (
+                    key TEXT PRIMARY KEY,
+                    llm_string TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_response_last_used ON llm_response (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if _bypass.get():
+            return None
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM llm_response WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_response SET last_used = ? WHERE key = ?", (now, key))
+        try:
+            generations = [loads(item) for item in json.loads(row[0])]
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        response = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_response (key, llm_string, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string, response, now, now),
+            )
+            if self.ttl_seconds is not None:
+                conn.execute("DELETE FROM llm_response WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM llm_response WHERE key IN (SELECT key FROM llm_response ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM llm_response")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM llm_response").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
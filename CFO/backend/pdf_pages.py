@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+from langchain_core.documents import Document
+from pypdf import PdfReader
+from telemetry import span
+
+
+DEFAULT_PAGE_BATCH = 16
+DEFAULT_EXTRACT_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _page_label(reader: PdfReader, index: int) -> str:
+    try:
+        return reader.page_labels[index]
+    except (IndexError, KeyError, ValueError):
+        return str(index + 1)
+
+
+_worker_reader = (None, None)
+
+
+def extract_page_batch(pdf_path: str, indexes: List[int]) -> List[Tuple[int, str, str]]:
+    """Runs in a worker process: (index, page_label, text) for each requested page."""
+    global _worker_reader
+    # A worker usually gets many batches of the same file in a row; keep its parsed reader.
+    key = (pdf_path, os.stat(pdf_path).st_mtime_ns)
+    if _worker_reader[0] != key:
+        _worker_reader = (key, PdfReader(pdf_path))
+    reader = _worker_reader[1]
+    return [(index, _page_label(reader, index), reader.pages[index].extract_text()) for index in indexes]
+
+
+def extraction_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    The process-wide extraction pool, started on first use and reused by later uploads.
+    Workers are spawned rather than forked: the web app runs request and job threads, and
+    forking a threaded process can deadlock the child.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = max_workers
+        return _pool
+
+
+def shutdown_extraction_pool():
+    """Stops the extraction workers, if any were started; the next extraction starts a new pool."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool, _pool_workers = None, 0
+
+
+class PdfPages:
+    """
+    Page-by-page access to a PDF. Nothing is extracted up front: each page's text is read
+    the first time it is asked for and kept, so a caller can look at a handful of pages of
+    a 300-page report without parsing the rest. Documents carry the same metadata as
+    PyPDFLoader ('source', 'page' (0-based), 'page_label', 'total_pages').
+    """
+
+    def __init__(self, pdf_path: str):
+        self.pdf_path = pdf_path
+        self._reader = PdfReader(pdf_path)
+        self.page_count = len(self._reader.pages)
+        self._texts: Dict[int, str] = {}
+        self._pool_pages = 0
+        self._lock = threading.Lock()
+
+    def text(self, index: int) -> str:
+        with self._lock:
+            if index not in self._texts:
+                with span("pdf_extract"):
+                    self._texts[index] = self._reader.pages[index].extract_text()
+            return self._texts[index]
+
+    def page_label(self, index: int) -> str:
+        return _page_label(self._reader, index)
+
+    def _make_document(self, index: int, label: str, text: str) -> Document:
+        return Document(
+            page_content=text,
+            metadata={'source': self.pdf_path, 'page': index, 'page_label': label, 'total_pages': self.page_count}
+        )
+
+    def document(self, index: int) -> Document:
+        return self._make_document(index, self.page_label(index), self.text(index))
+
+    def documents(self, indexes: Iterable[int]) -> List[Document]:
+        return [self.document(index) for index in sorted(set(indexes)) if 0 <= index < self.page_count]
+
+    def iter_documents(self, indexes: Iterable[int], max_workers: int = DEFAULT_EXTRACT_WORKERS, batch_size: int = DEFAULT_PAGE_BATCH) -> Iterator[Document]:
+        """
+        Yields page Documents in page order, extracting batches of pages in the process pool.
+        At most two batches per worker are in flight, so memory stays bounded however long
+        the report is, while the caller splits and embeds earlier pages. Pages already read
+        in this process are not extracted again; small jobs skip the pool entirely.
+        """
+        indexes = [index for index in sorted(set(indexes)) if 0 <= index < self.page_count]
+        with self._lock:
+            pending = [index for index in indexes if index not in self._texts]
+        if max_workers <= 1 or len(pending) < 2 * batch_size:
+            for index in indexes:
+                yield self.document(index)
+            return
+
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        pool = extraction_pool(max_workers)
+        in_flight = deque()
+        extracted: Dict[int, Tuple[str, str]] = {}
+        next_batch = 0
+        for index in indexes:
+            if index in self._texts:
+                yield self.document(index)
+                continue
+            while index not in extracted:
+                while next_batch < len(batches) and len(in_flight) < 2 * max_workers:
+                    in_flight.append(pool.submit(extract_page_batch, self.pdf_path, batches[next_batch]))
+                    next_batch += 1
+                # Time spent waiting on the workers; their own extraction runs in other processes.
+                with span("pdf_extract", pool=True):
+                    batch = in_flight.popleft().result()
+                for page_index, label, text in batch:
+                    extracted[page_index] = (label, text)
+            label, text = extracted.pop(index)
+            self._pool_pages += 1
+            yield self._make_document(index, label, text)
+
+    @property
+    def pages_read(self) -> int:
+        """Pages parsed so far, in this process or in the pool."""
+        return len(self._texts) + self._pool_pages
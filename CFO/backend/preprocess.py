@@ -1,104 +1,61 @@
 import os
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import FAISS
-from pydantic import BaseModel, Field
-from langchain_core.prompts import PromptTemplate, ChatPromptTemplate, ChatMessagePromptTemplate, MessagesPlaceholder
+from embedding_cache import cached_embeddings
+from embedding_scheduler import EmbeddingScheduler
+from document_map import DocumentMap, document_navigator_prompt, load_document_map, map_document
+from indexing import build_index
 
 
 load_dotenv()
 
 SOURCE_PDF_PATH = "C:/Users/abhay/Desktop/CFO/backend/uploads/sample_data.pdf"
-# FAISS_INDEX_PATH = "faiss_index"
+FAISS_INDEX_PATH = "faiss_index/preprocessed"
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache")
 
-print("Starting the preprocessing script...")
 
-print(f"Loading PDF from: {SOURCE_PDF_PATH}")
-loader = PyPDFLoader(SOURCE_PDF_PATH)
-docs = loader.load()
+# PDF pages are extracted in spawned worker processes, which re-import this file;
+# everything runs under the __main__ guard so the workers do not repeat it.
+def main():
+    print("Starting the preprocessing script...")
 
+    print(f"Loading PDF from: {SOURCE_PDF_PATH}")
 
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1500,
+        chunk_overlap=300
+    )
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1500,
-    chunk_overlap=300
-)
-print("Splitting the document into chunks...")
-chunks = text_splitter.split_documents(docs[:20])
-print(f"Document split into {len(chunks)} chunks.")
+    print("Initializing embedding model...")
+    scheduler = EmbeddingScheduler(
+        GoogleGenerativeAIEmbeddings(model="text-embedding-004"),
+        requests_per_minute=int(os.getenv('EMBEDDING_RPM', 1500)),
+        tokens_per_minute=int(os.getenv('EMBEDDING_TPM', 0))
+    )
+    embedding_model = cached_embeddings(scheduler, EMBEDDING_CACHE_DIR)
 
+    model = ChatGoogleGenerativeAI(model='gemini-1.5-flash')
+    document_mapping_model = model.with_structured_output(DocumentMap)
 
-print("Initializing embedding model...")
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    document_mapping_chain = document_navigator_prompt | document_mapping_model
 
-print("\nCreating the vector store from document chunks...")
-print("This is the slow part and will make many API calls to Google.")
-print("Please be patient, this can take several minutes...\n")
+    # --- SAVE THE VECTOR STORE LOCALLY ---
+    # Same pipeline as the upload handlers: the table of contents is mapped once (and the map saved
+    # with the index), then only the statement pages are extracted in parallel and streamed through
+    # the splitter into the embedder. Chunks already in the embedding cache are not sent to Google.
+    print(f"Saving the vector store to local path: {FAISS_INDEX_PATH}")
+    mapper = lambda first_pages, page_count, page_text: map_document(first_pages, page_count, document_mapping_chain, embedding_model, text_splitter, page_text)
+    build_index(SOURCE_PDF_PATH, FAISS_INDEX_PATH, embedding_model, text_splitter, mapper, statement_margin=2)
 
-vector_store_for_TOC = FAISS.from_documents(
-    documents=chunks,
-    embedding=embedding_model
-)
+    print(load_document_map(FAISS_INDEX_PATH))
+    print(f"Embedding cache: {embedding_model.cache.stats()}")
+    print(f"Embedding requests: {scheduler.stats()}")
 
-toc_retriever = vector_store_for_TOC.as_retriever(search_type='similarity', search_kwargs={'k':3})
+    print("\nPreprocessing complete!")
+    print(f"Vector store has been created and saved in the '{FAISS_INDEX_PATH}' folder.")
+    print("You can now run your Flask app.")
 
-toc = toc_retriever.invoke("Table of Contents")
 
-toc_text = "\n\n".join(document.page_content for document in toc)
-
-class PageRange(BaseModel):
-    """Defines the start and end page for a document section."""
-    start_page: int = Field(description="The page number where the section begins.")
-    end_page: int = Field(description="The page number where the section ends.")
-
-class DocumentMap(BaseModel):
-    """A structured map of key financial statement sections in the report."""
-    consolidated_profit_loss: PageRange
-    consolidated_balance_sheet: PageRange
-    consolidated_cash_flow: PageRange
-
-document_navigator_prompt = PromptTemplate(
-    template="""
-        You are an expert document analyst. Your task is to find the STARTING and ENDING page numbers for the key financial statements based on the provided Table of Contents.
-
-        A statement section ends where the next major section begins. Based ONLY on the CONTEXT below, find the page ranges and populate the JSON object according to the schema.
-
-        CONTEXT:
-        {table_of_contents_text}
-    """,
-    input_variables=['table_of_contents_text']
-)
-
-model = ChatGoogleGenerativeAI(model='gemini-1.5-flash')
-document_mapping_model = model.with_structured_output(DocumentMap)
-
-document_mapping_chain = document_navigator_prompt | document_mapping_model
-
-print(document_mapping_chain.invoke({'table_of_contents_text':toc_text}))
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-# # # --- 3. SAVE THE VECTOR STORE LOCALLY ---
-# # print(f"Saving the vector store to local path: {FAISS_INDEX_PATH}")
-# # vector_store.save_local(FAISS_INDEX_PATH)
-
-# print("\nPreprocessing complete!")
-# # print(f"Vector store has been created and saved in the '{FAISS_INDEX_PATH}' folder.")
-# print("You can now run your Flask app.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
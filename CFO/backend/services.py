@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class ServiceRegistry:
+    """
+    Named, process-wide services (LLM clients, embedding models, caches, chains) that are
+    built the first time they are used and shared after that. Registering a factory costs
+    nothing, so modules that import LangChain, Gemini, FAISS or pandas are only loaded by
+    the requests that need them; a worker serving login pages never pays for them.
+
+        services = ServiceRegistry()
+
+        @services.register
+        def model():
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            return ChatGoogleGenerativeAI(model='gemini-1.5-flash')
+
+        services.model.invoke(...)
+
+    Each service is built at most once, even when several threads ask for it together.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.build_seconds: Dict[str, float] = {}
+
+    def register(self, factory: Callable[[], Any], name: str = None) -> Callable[[], Any]:
+        """Registers factory under its function name (or name). Usable as a decorator."""
+        name = name or factory.__name__
+        with self._lock:
+            self._factories[name] = factory
+            self._build_locks[name] = threading.Lock()
+        return factory
+
+    def get(self, name: str) -> Any:
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        if name not in self._factories:
+            raise AttributeError(f"No service named '{name}' is registered.")
+        with self._build_locks[name]:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.build_seconds[name] = time.perf_counter() - started
+        return self._instances[name]
+
+    def peek(self, name: str, default: Any = None) -> Any:
+        """The service if it has been built, without building it (for stats and health checks)."""
+        return self._instances.get(name, default)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.get(name)
+
+    def override(self, name: str, instance: Any):
+        """Uses instance for name from now on (tests and benchmarks swap in local fakes this way)."""
+        with self._lock:
+            self._instances[name] = instance
+
+    def reset(self, name: str = None):
+        """Forgets built instances (one, or all) so the next use builds them again."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def stats(self) -> dict:
+        return {
+            "registered": sorted(self._factories),
+            "built": {name: round(seconds, 3) for name, seconds in sorted(self.build_seconds.items()) if name in self._instances},
+        }
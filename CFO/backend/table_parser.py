@@ -0,0 +1,220 @@
+import math
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Union
+import pandas as pd
+from pydantic import BaseModel
+
+
+DEFAULT_MIN_CONFIDENCE = 0.85
+HEADER_SCAN_ROWS = 10
+
+# Extra row labels seen in Indian annual-report workbooks, on top of the quoted label in each question.
+EXTRA_SYNONYMS = {
+    "fiscal_year": ["report for fiscal year", "fiscal year", "financial year", "year ended"],
+    "revenue_current_year": ["revenue from operations", "total revenue from operations", "net sales", "turnover"],
+    "revenue_previous_year": ["revenue from operations", "total revenue from operations", "net sales", "turnover"],
+    "profit_after_tax_current_year": ["profit / (loss) for the year", "profit for the year", "profit after tax", "net profit"],
+    "profit_after_tax_previous_year": ["profit / (loss) for the year", "profit for the year", "profit after tax", "net profit"],
+    "cash_reserves": ["consolidated cash balance", "cash and cash equivalents", "cash balance"],
+    "net_cash_from_operations": ["net cash generated from / (used in) operating activities", "net cash from operating activities", "net cash flow from operating activities"],
+    "total_current_assets": ["total current assets"],
+    "total_current_liabilities": ["total current liabilities"],
+    "total_liabilities": ["total liabilities"],
+    "total_equity": ["total equity", "total shareholders equity", "shareholders funds"],
+}
+
+# Words in a sheet name that point at the statement a metric comes from.
+SHEET_HINTS = {
+    "fiscal_year": ["summary", "cover", "highlights"],
+    "revenue_current_year": ["p&l", "profit", "income", "loss"],
+    "revenue_previous_year": ["p&l", "profit", "income", "loss"],
+    "profit_after_tax_current_year": ["p&l", "profit", "income", "loss"],
+    "profit_after_tax_previous_year": ["p&l", "profit", "income", "loss"],
+    "cash_reserves": ["summary", "highlights", "balance"],
+    "net_cash_from_operations": ["cash flow", "cashflow"],
+    "total_current_assets": ["balance"],
+    "total_current_liabilities": ["balance"],
+    "total_liabilities": ["balance"],
+    "total_equity": ["balance"],
+}
+
+UNIT_PATTERNS = [
+    ("crore", re.compile(r"\b(crores?|cr\.?)\b", re.IGNORECASE)),
+    ("lakh", re.compile(r"\b(lakhs?|lacs?)\b", re.IGNORECASE)),
+    ("thousand", re.compile(r"\b(thousands?|'000|000s)\b", re.IGNORECASE)),
+]
+YEAR_PATTERN = re.compile(r"\bFY\s*'?\s*(\d{2,4})(?:\s*[-/]\s*(\d{2,4}))?\b|\b((?:19|20)\d{2})(?:\s*[-/]\s*(\d{2,4}))?\b", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"^\(?\s*[-−]?\s*[\d,]*\.?\d+\s*\)?$")
+
+
+class ParsedMetric(BaseModel):
+    """A value read directly from a worksheet, with where it came from and how sure the match is."""
+    value: Union[float, str]
+    unit: str
+    confidence: float
+    sheet: str
+    label: str
+
+
+def normalize_label(text) -> str:
+    text = str(text).lower().replace("&", " and ")
+    text = re.sub(r"\(.*?\)", lambda m: m.group(0) if "loss" in m.group(0) or "used" in m.group(0) else " ", text)
+    text = re.sub(r"[^a-z0-9/]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def build_synonyms(questions: Dict[str, str], extra: Dict[str, List[str]] = EXTRA_SYNONYMS) -> Dict[str, List[str]]:
+    """Row labels to look for per metric: the quoted line item in its question plus known synonyms."""
+    synonyms = {}
+    for key, question in questions.items():
+        labels = re.findall(r"'([^']+)'", question) + extra.get(key, [])
+        synonyms[key] = list(dict.fromkeys(normalize_label(label) for label in labels if label))
+    return synonyms
+
+
+def detect_unit(text) -> Optional[str]:
+    for unit, pattern in UNIT_PATTERNS:
+        if pattern.search(str(text)):
+            return unit
+    return None
+
+
+def parse_number(cell):
+    """Parses numeric cells, '1,234', '(971)' as -971 and '15,200 Crores'. Returns (value, unit) or None."""
+    if cell is None or isinstance(cell, bool):
+        return None
+    if isinstance(cell, (int, float)):
+        return None if isinstance(cell, float) and math.isnan(cell) else (float(cell), None)
+    text = str(cell).strip()
+    unit = detect_unit(text)
+    text = re.sub(r"(?i)(₹|rs\.?|inr|crores?|cr\.?|lakhs?|lacs?|thousands?)", "", text).strip()
+    if not text or not NUMBER_PATTERN.match(text):
+        return None
+    negative = text.startswith("(") and text.endswith(")")
+    number = float(re.sub(r"[^\d.\-−]", "", text).replace("−", "-"))
+    return (-abs(number) if negative else number, unit)
+
+
+def parse_year(cell) -> Optional[int]:
+    match = YEAR_PATTERN.search(str(cell))
+    if not match:
+        return None
+    groups = [g for g in match.groups() if g]
+    year = int(groups[-1]) if len(groups) > 1 else int(groups[0])
+    return year + 2000 if year < 100 else year
+
+
+def _sheet_factor(key: str, sheet_name: str) -> float:
+    name = sheet_name.lower()
+    factor = 1.0 if any(hint in name for hint in SHEET_HINTS.get(key, [])) else 0.9
+    if "standalone" in name:
+        factor *= 0.85
+    return factor
+
+
+def _label_score(label: str, synonyms: List[str]) -> float:
+    if not label:
+        return 0.0
+    if label in synonyms:
+        return 1.0
+    return max((SequenceMatcher(None, label, synonym).ratio() for synonym in synonyms), default=0.0)
+
+
+class SheetTable:
+    """A worksheet viewed as a grid, with its year columns and unit worked out up front."""
+
+    def __init__(self, name: str, df: pd.DataFrame):
+        self.name = name
+        self.rows = [list(df.columns)] + df.values.tolist()
+        self.year_columns = {}
+        self.column_units = {}
+        self.header_row = None
+        for row_number, row in enumerate(self.rows[:HEADER_SCAN_ROWS]):
+            years = {col: parse_year(cell) for col, cell in enumerate(row) if col > 0 and isinstance(cell, str)}
+            years = {col: year for col, year in years.items() if year}
+            if years:
+                self.header_row = row_number
+                self.year_columns = years
+                self.column_units = {col: detect_unit(row[col]) for col in years}
+                break
+        top_text = " ".join(str(cell) for row in self.rows[:HEADER_SCAN_ROWS] for cell in row if isinstance(cell, str))
+        self.unit = detect_unit(top_text) or "none"
+
+    def period_columns(self) -> List[int]:
+        """Year columns, most recent first."""
+        return sorted(self.year_columns, key=lambda col: self.year_columns[col], reverse=True)
+
+    def latest_year_label(self) -> Optional[str]:
+        columns = self.period_columns()
+        if not columns:
+            return None
+        year = self.year_columns[columns[0]]
+        return f"FY{year % 100:02d}"
+
+
+def _find_value(table: SheetTable, key: str, synonyms: List[str]) -> Optional[ParsedMetric]:
+    period = 1 if key.endswith("_previous_year") else 0
+    columns = table.period_columns()
+    best = None
+    for row_number, row in enumerate(table.rows):
+        if row_number == table.header_row and key != "fiscal_year":
+            continue
+        for label_col in range(min(2, len(row))):
+            if not isinstance(row[label_col], str):
+                continue
+            score = _label_score(normalize_label(row[label_col]), synonyms)
+            if score < 0.6 or (best and score <= best[0]):
+                continue
+
+            if key == "fiscal_year":
+                value = next((cell for cell in row[label_col + 1:] if isinstance(cell, str) and parse_year(cell)), None)
+                if value:
+                    best = (score, ParsedMetric(value=value.strip(), unit="none", confidence=score, sheet=table.name, label=row[label_col]))
+                continue
+
+            if columns and len(columns) > period:
+                column = columns[period]
+                parsed = parse_number(row[column]) if column < len(row) else None
+                column_factor = 1.0
+            elif period == 0:
+                # Label/value layout without year headers: take the first number to the right.
+                column = None
+                parsed = next((parse_number(cell) for cell in row[label_col + 1:] if parse_number(cell)), None)
+                column_factor = 0.95
+            else:
+                parsed = None
+            if not parsed:
+                continue
+
+            value, cell_unit = parsed
+            unit = cell_unit or (table.column_units.get(column) if column is not None else None) or table.unit
+            confidence = round(score * column_factor, 4)
+            best = (score, ParsedMetric(value=value, unit=unit, confidence=confidence, sheet=table.name, label=row[label_col]))
+    return best[1] if best else None
+
+
+def parse_financial_workbook(frames: Dict[str, pd.DataFrame], synonyms: Dict[str, List[str]]) -> Dict[str, ParsedMetric]:
+    """
+    Finds every metric in the workbook by label without calling a model. For each metric
+    the best-scoring match across sheets is returned; callers decide which confidences
+    are good enough and send the rest to the LLM.
+    """
+    tables = [SheetTable(name, df) for name, df in frames.items()]
+    found: Dict[str, ParsedMetric] = {}
+    for key, labels in synonyms.items():
+        for table in tables:
+            match = _find_value(table, key, labels)
+            if match is None:
+                continue
+            match.confidence = round(match.confidence * _sheet_factor(key, table.name), 4)
+            if key not in found or match.confidence > found[key].confidence:
+                found[key] = match
+
+    if "fiscal_year" in synonyms and "fiscal_year" not in found:
+        for table in tables:
+            label = table.latest_year_label()
+            if label:
+                found["fiscal_year"] = ParsedMetric(value=label, unit="none", confidence=0.9, sheet=table.name, label="latest year column")
+                break
+    return found
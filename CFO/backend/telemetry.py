@@ -0,0 +1,424 @@
+"""
+In-process tracing and Prometheus metrics for the analysis pipeline.
+
+Stages are timed with span():
+
+    with span("embed", texts=len(texts)):
+        vectors = embedding_model.embed_documents(texts)
+
+Every span is observed in a latency histogram labelled with its stage and metric (spans
+inherit the metric of the span they run in, so retrieval and LLM calls inside a metric's
+extraction are attributed to that metric) and failed spans are counted. Inside trace()
+the spans are also collected, with their nesting, into a Trace; the most recent traces
+are kept in memory and served as JSON. render_prometheus() writes the metrics in the
+Prometheus text format. Metrics are per process: each worker is scraped on its own.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+NAMESPACE = 'cfo'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+DEFAULT_RECENT_TRACES = 50
+MAX_TRACE_SPANS = 2000
+
+_current_span = ContextVar('telemetry_span', default=None)
+_current_trace = ContextVar('telemetry_trace', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float('inf') else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative latency buckets, sum and count per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {bucket_count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CollectedMetric:
+    """A gauge or counter whose values are read from fn() at scrape time: a number, or {label values: number}."""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], object], labelnames: Sequence[str] = ()):
+        self.name, self.help, self.kind, self.fn, self.labelnames = name, help, kind, fn, tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        values = self.fn()
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} {_number(value)}"
+            for key, value in values.items() if value is not None
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = NAMESPACE):
+        self.namespace = namespace
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(f"{self.namespace}_{name}", help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.namespace}_{name}", help, labelnames, buckets))
+
+    def collect(self, name: str, help: str, fn: Callable[[], object], kind: str = 'gauge', labelnames: Sequence[str] = ()) -> CollectedMetric:
+        """Registers (or replaces) a metric read from fn() on every scrape."""
+        metric = CollectedMetric(f"{self.namespace}_{name}", help, kind, fn, labelnames)
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as exc:
+                print(f"Metric {metric.name} could not be collected: {exc!r}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.histogram('stage_duration_seconds', "Duration of pipeline stages.", ['stage', 'metric'])
+stage_errors = registry.counter('stage_errors_total', "Pipeline stages that raised.", ['stage', 'metric'])
+llm_seconds = registry.histogram('llm_call_duration_seconds', "Duration of chat model calls, by the stage that made them.", ['stage', 'metric'])
+llm_calls = registry.counter('llm_calls_total', "Chat model calls; cached=\"true\" ones were answered from the LLM cache.", ['stage', 'cached'])
+llm_errors = registry.counter('llm_errors_total', "Chat model calls that raised.", ['stage'])
+llm_tokens = registry.counter('llm_tokens_total', "Prompt and completion tokens reported by the model (cached calls excluded).", ['stage', 'metric', 'type'])
+
+
+class Span:
+    __slots__ = ('span_id', 'parent_id', 'stage', 'metric', 'attributes', 'started')
+
+    def __init__(self, stage: str, metric: str, parent: Optional['Span'], attributes: dict):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.stage = stage
+        self.metric = metric
+        self.attributes = attributes
+        self.started = time.perf_counter()
+
+    def set(self, **attributes):
+        """Adds attributes (counts, sizes) found out while the span runs."""
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """The spans of one request or job, in the order they finished."""
+
+    def __init__(self, name: str, trace_id: str = None, **attributes):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.utcnow().isoformat()
+        self.started = time.perf_counter()
+        self.duration_seconds = None
+        self.spans: List[dict] = []
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            if len(self.spans) < MAX_TRACE_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped_spans += 1
+
+    def finish(self):
+        self.duration_seconds = round(time.perf_counter() - self.started, 6)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        for record in spans:
+            summary = stages.setdefault(record['stage'], {"stage": record['stage'], "count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            summary["count"] += 1
+            summary["seconds"] = round(summary["seconds"] + record['duration_seconds'], 6)
+            summary["max_seconds"] = max(summary["max_seconds"], record['duration_seconds'])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration_seconds,
+            # Slowest stage first; nested stages are also counted in their parents.
+            "stages": sorted(stages.values(), key=lambda summary: summary["seconds"], reverse=True),
+            "spans": spans,
+            "dropped_spans": self.dropped_spans,
+        }
+
+
+class RecentTraces:
+    """The last capacity finished traces, by id. A capacity of 0 turns tracing off."""
+
+    def __init__(self, capacity: int = DEFAULT_RECENT_TRACES):
+        self.capacity = capacity
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            self._traces.move_to_end(trace.trace_id)
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+
+recent_traces = RecentTraces()
+
+
+def configure(recent: int = DEFAULT_RECENT_TRACES):
+    recent_traces.capacity = max(0, recent)
+
+
+def _span_record(span: Span, duration: float, error: BaseException = None) -> dict:
+    trace = _current_trace.get()
+    return {
+        "span_id": span.span_id,
+        "parent_id": span.parent_id,
+        "stage": span.stage,
+        "metric": span.metric or None,
+        "start_offset_seconds": round(span.started - trace.started, 6) if trace else None,
+        "duration_seconds": round(duration, 6),
+        "attributes": span.attributes,
+        "error": f"{type(error).__name__}: {error}" if error is not None else None,
+    }
+
+
+def _new_span(stage: str, metric: Optional[str], attributes: dict) -> Span:
+    parent = _current_span.get()
+    return Span(stage, metric if metric is not None else (parent.metric if parent else ''), parent, attributes)
+
+
+def _finish(current: Span, error: BaseException = None):
+    duration = time.perf_counter() - current.started
+    stage_seconds.observe(duration, stage=current.stage, metric=current.metric)
+    if error is not None:
+        stage_errors.inc(stage=current.stage, metric=current.metric)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(_span_record(current, duration, error))
+
+
+@contextmanager
+def span(stage: str, metric: str = None, **attributes):
+    """Times the block as one stage; metric defaults to that of the enclosing span."""
+    current = _new_span(stage, metric, attributes)
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(current, error)
+
+
+def record(stage: str, started: float, metric: str = None, error: BaseException = None, **attributes):
+    """Records a stage timed outside a with block (from started, a perf_counter() value, until now), e.g. in event hooks."""
+    current = _new_span(stage, metric, attributes)
+    current.started = started
+    _finish(current, error)
+
+
+def start_trace(name: str, trace_id: str = None, **attributes):
+    """Starts collecting the spans of this context into a new trace; pass the returned handle to end_trace."""
+    if recent_traces.capacity <= 0 or _current_trace.get() is not None:
+        return None
+    current = Trace(name, trace_id, **attributes)
+    return _current_trace.set(current), current
+
+
+def end_trace(handle) -> Optional[Trace]:
+    if handle is None:
+        return None
+    token, current = handle
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # Ended from another context (e.g. a streamed response closed elsewhere); nothing to restore.
+        pass
+    current.finish()
+    recent_traces.add(current)
+    return current
+
+
+@contextmanager
+def trace(name: str, trace_id: str = None, **attributes):
+    """Collects the spans run in the block (and in threads started with a copy of its context) into a kept trace."""
+    handle = start_trace(name, trace_id, **attributes)
+    try:
+        yield _current_trace.get()
+    finally:
+        end_trace(handle)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def get_trace(trace_id: str) -> Optional[Trace]:
+    return recent_traces.get(trace_id)
+
+
+def record_llm_call(parent: Optional[Span], trace: Optional[Trace], started: float, prompt_tokens: int = 0,
+                    completion_tokens: int = 0, cached: bool = False, model: str = None, error: BaseException = None,
+                    stage: str = 'none'):
+    """
+    Records one chat model call made inside the parent span (as seen when the call started);
+    calls made outside any span are labelled with stage.
+    """
+    duration = time.perf_counter() - started
+    stage, metric = (parent.stage, parent.metric) if parent else (stage, '')
+    llm_seconds.observe(duration, stage=stage, metric=metric)
+    if error is not None:
+        llm_errors.inc(stage=stage)
+    else:
+        llm_calls.inc(stage=stage, cached='true' if cached else 'false')
+        if not cached:
+            llm_tokens.inc(prompt_tokens, stage=stage, metric=metric, type='prompt')
+            llm_tokens.inc(completion_tokens, stage=stage, metric=metric, type='completion')
+    if trace is not None:
+        call = Span('llm', metric, parent, {
+            "model": model, "cached": cached, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+        })
+        call.started = started
+        trace.add(dict(_span_record(call, duration, error), start_offset_seconds=round(started - trace.started, 6)))
+
+
+def llm_callback_handler():
+    """
+    A LangChain callback handler that records every call of the chat model it is attached
+    to. Calls outside any span (e.g. streamed from a response generator) take their stage
+    from the run's metadata: chain.stream(inputs, config={"metadata": {"stage": "chat"}}).
+    Built lazily because it imports LangChain.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMTelemetryHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._runs = {}
+            self._lock = threading.Lock()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            metadata = kwargs.get('metadata') or {}
+            model = metadata.get('ls_model_name') or (serialized or {}).get('name')
+            with self._lock:
+                self._runs[run_id] = (time.perf_counter(), _current_span.get(), _current_trace.get(), model, metadata.get('stage', 'none'))
+
+        def _pop(self, run_id):
+            with self._lock:
+                return self._runs.pop(run_id, None)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            run = self._pop(run_id)
+            if run is None:
+                return
+            started, parent, trace, model, stage = run
+            prompt_tokens = completion_tokens = 0
+            cached = False
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                    prompt_tokens += usage.get('input_tokens', 0)
+                    completion_tokens += usage.get('output_tokens', 0)
+                    # LangChain zeroes total_cost on responses served from the cache.
+                    cached = cached or usage.get('total_cost') == 0
+            record_llm_call(parent, trace, started, prompt_tokens, completion_tokens, cached, model, stage=stage)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            run = self._pop(run_id)
+            if run is not None:
+                started, parent, trace, model, stage = run
+                record_llm_call(parent, trace, started, model=model, error=error, stage=stage)
+
+    return LLMTelemetryHandler()
+
+
+def render_prometheus() -> str:
+    return registry.render()
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pydantic import BaseModel
+
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised while a file is being received, as soon as it passes its size limit."""
+
+
+class StoredFile(BaseModel):
+    sha256: str
+    path: str
+    size: int
+    deduplicated: bool
+
+
+class StagedUpload:
+    """
+    A file being received. Every chunk is hashed and written to a staging file as it
+    arrives, so memory use does not grow with the file and the hash is ready once the
+    last chunk is in. Readable and seekable like a temporary file (it is handed to
+    Werkzeug as the upload stream); closing an uncommitted upload deletes it.
+    """
+
+    def __init__(self, staging_dir: str, max_bytes: int = None):
+        fd, self.path = tempfile.mkstemp(prefix='upload-', dir=staging_dir)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.close()
+            raise UploadTooLargeError(f"Uploaded file is larger than {self.max_bytes / (1024 * 1024):.0f} MB.")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, flush, closed, ... of the staging file
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        self._file.close()
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class UploadStore:
+    """
+    Content-addressed storage for uploaded reports. Each distinct file is kept once, as
+    <root>/<sha256[:2]>/<sha256><extension>, however many users upload it and under
+    whatever name; who uploaded what is recorded by the caller. The stored path never
+    changes for the same content, so it doubles as a stable document key for the caches.
+    """
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.staging_dir = os.path.join(root, '.incoming')
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def path_for(self, sha256: str, extension: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256 + extension.lower())
+
+    def open_stream(self, max_bytes: int = None) -> StagedUpload:
+        """A new staged upload, limited to max_bytes (default: the store's limit)."""
+        return StagedUpload(self.staging_dir, self.max_bytes if max_bytes is None else max_bytes)
+
+    def commit(self, staged: StagedUpload, filename: str) -> StoredFile:
+        """Moves a fully received upload to its content address, or drops it if that content is already stored."""
+        sha256, size = staged.sha256, staged.size
+        path = self.path_for(sha256, os.path.splitext(filename)[1])
+        staged.flush()
+        with self._lock:
+            deduplicated = os.path.exists(path)
+            if not deduplicated:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(staged.path, path)
+                staged.committed = True
+            if deduplicated:
+                self.deduplicated += 1
+            else:
+                self.stored += 1
+        staged.close()
+        return StoredFile(sha256=sha256, path=path, size=size, deduplicated=deduplicated)
+
+    def add(self, source, filename: str, max_bytes: int = None) -> StoredFile:
+        """Stores the contents of a readable binary file object (e.g. a zip member), streamed in chunks."""
+        staged = self.open_stream(max_bytes)
+        try:
+            shutil.copyfileobj(source, staged, COPY_CHUNK_SIZE)
+        except BaseException:
+            staged.close()
+            raise
+        return self.commit(staged, filename)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"stored": self.stored, "deduplicated": self.deduplicated, "max_bytes": self.max_bytes}
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+from telemetry import span
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def index_size_bytes(index_path: str, exclude: Iterable[str] = ()) -> int:
+    """On-disk size of a saved index; a close estimate of what it occupies once loaded."""
+    total = 0
+    for name in os.listdir(index_path):
+        file_path = os.path.join(index_path, name)
+        if os.path.isfile(file_path) and name not in exclude:
+            total += os.path.getsize(file_path)
+    return total
+
+
+class VectorStoreCache:
+    """
+    Process-wide LRU cache of loaded vector stores keyed by index path.
+
+    Entries are evicted least recently used once the summed index size passes max_bytes.
+    An entry is sized by sizer(index_path, store) when given, so structures built alongside
+    a loaded store count too; otherwise by the index's size on disk. Concurrent requests
+    for the same index wait for a single load instead of each deserialising it.
+    """
+
+    def __init__(self, loader: Callable[[str], object], max_bytes: int = DEFAULT_MAX_BYTES,
+                 sizer: Optional[Callable[[str, object], int]] = None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.sizer = sizer or (lambda index_path, store: index_size_bytes(index_path))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_load_seconds = 0.0
+
+    def get(self, index_path: str):
+        key = os.path.abspath(index_path)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                load_done = self._loading.get(key)
+                if load_done is None:
+                    self.misses += 1
+                    load_done = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this index; wait for it and read the result from the cache.
+            load_done.wait()
+
+        try:
+            started = time.perf_counter()
+            with span("faiss_load"):
+                store = self.loader(key)
+            load_seconds = time.perf_counter() - started
+            size = self.sizer(key, store)
+            with self._lock:
+                self.total_load_seconds += load_seconds
+                self._entries[key] = (store, size)
+                self._evict()
+            print(f"Loaded vector store {os.path.basename(key)[:12]} in {load_seconds:.2f}s ({size / 1e6:.1f} MB)")
+            return store
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def _evict(self):
+        total = sum(size for _, size in self._entries.values())
+        # Always keep the most recently used entry, even if it alone is over budget.
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, index_path: str):
+        with self._lock:
+            self._entries.pop(os.path.abspath(index_path), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(size for _, size in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "total_load_seconds": round(self.total_load_seconds, 4),
+                "avg_load_seconds": round(self.total_load_seconds / self.misses, 4) if self.misses else None,
+            }
@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+import pandas as pd
+
+
+MAX_CACHED_WORKBOOKS = 8
+
+
+class Workbook:
+    """
+    An Excel workbook opened once, with parsed sheets and their CSV renderings cached.
+
+    pd.ExcelFile keeps the parsed workbook open, so reading several sheets does not
+    re-parse the file for each one.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._excel = pd.ExcelFile(file_path)
+        self.sheet_names: List[str] = self._excel.sheet_names
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._csv: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def load(self, sheet_names: Iterable[str]):
+        """Parses every requested sheet that is not cached yet, in one pass over the workbook."""
+        with self._lock:
+            missing = [name for name in dict.fromkeys(sheet_names) if name in self.sheet_names and name not in self._frames]
+            if missing:
+                self._frames.update(self._excel.parse(sheet_name=missing))
+        return self
+
+    def frame(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in self._frames:
+            self.load([sheet_name])
+        return self._frames[sheet_name]
+
+    def csv(self, sheet_name: str) -> str:
+        with self._lock:
+            cached = self._csv.get(sheet_name)
+        if cached is not None:
+            return cached
+        rendered = self.frame(sheet_name).to_csv(index=False)
+        with self._lock:
+            return self._csv.setdefault(sheet_name, rendered)
+
+
+_workbooks = OrderedDict()
+_workbooks_lock = threading.Lock()
+
+
+def load_workbook(file_path: str) -> Workbook:
+    """Returns a cached Workbook for the file, reopening it only if the file changed on disk."""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _workbooks_lock:
+        if key in _workbooks:
+            _workbooks.move_to_end(key)
+            return _workbooks[key]
+    workbook = Workbook(file_path)
+    with _workbooks_lock:
+        workbook = _workbooks.setdefault(key, workbook)
+        while len(_workbooks) > MAX_CACHED_WORKBOOKS:
+            _workbooks.popitem(last=False)
+    return workbook
+
+
+def group_metrics_by_sheet(location_map: dict, skip=('company_name',)) -> Dict[str, List[str]]:
+    """Turns {metric: sheet} into {sheet: [metrics]}, ignoring unmapped metrics."""
+    groups: Dict[str, List[str]] = {}
+    for key, sheet_name in location_map.items():
+        if sheet_name and key not in skip:
+            groups.setdefault(sheet_name, []).append(key)
+    return groups